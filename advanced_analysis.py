@@ -1,18 +1,33 @@
 import pandas as pd
 import numpy as np
-from datetime import datetime, timedelta
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from scipy.signal import argrelextrema
 from sklearn.preprocessing import MinMaxScaler
+from alice_client import fetch_historical_bars, get_history, broker_now
+from data_requirements import (
+    DataRequirement, STRATEGY_REQUIREMENTS, FULL_HISTORY_DAYS, custom_requirement, history_days
+)
+from bar_decoder import bars_to_frame
+from timeframes import get_timeframe
+from correlation import cluster_tokens, diversify_results
+from factors import (
+    build_close_panel, compute_cross_sectional_factors, apply_cross_sectional_factors,
+    load_sector_map, fetch_benchmark
+)
+
+# Strategies whose score also depends on how a stock ranks against the universe
+CROSS_SECTIONAL_STRATEGIES = ["Multi-Factor Analysis"]
 
 def get_historical_data(alice, token, from_date, to_date, interval="D", exchange='NSE'):
     """Fetch historical data and return as a DataFrame."""
     exchange_name = 'BSE (1)' if exchange == 'BSE' else 'NSE'
     instrument = alice.get_instrument_by_token(exchange_name, token)
-    historical_data = alice.get_historical(instrument, from_date, to_date, interval)
-    df = pd.DataFrame(historical_data).dropna()
+    df = bars_to_frame(fetch_historical_bars(alice, instrument, from_date, to_date, interval))
     return instrument, df
 
+# Names ``identify_candlestick_patterns`` can report
+CANDLESTICK_PATTERNS = ['Doji', 'Hammer', 'Bullish Engulfing']
+
 def identify_candlestick_patterns(df):
     """Identify common candlestick patterns."""
     patterns = []
@@ -76,6 +91,26 @@ def analyze_volume_profile(df):
     
     return high_volume_nodes
 
+def analyze_volume_profile_fast(df):
+    """
+    Vectorized ``analyze_volume_profile``: the same bins and thresholds, with the
+    per-bar loop replaced by one ``np.bincount``.
+    """
+    low = df['low'].min()
+    bin_size = (df['high'].max() - low) / 50
+    price_levels = np.arange(low, df['high'].max(), bin_size)
+
+    bin_index = ((df['close'].to_numpy() - low) / bin_size).astype(np.int64)
+    in_range = (bin_index >= 0) & (bin_index < len(price_levels))
+    volume = np.bincount(
+        bin_index[in_range], weights=df['volume'].to_numpy()[in_range], minlength=len(price_levels)
+    )
+
+    volume_profile = pd.DataFrame({'price_level': price_levels, 'volume': volume})
+    mean_volume = volume_profile['volume'].mean()
+    std_volume = volume_profile['volume'].std()
+    return volume_profile[volume_profile['volume'] > mean_volume + std_volume]
+
 def analyze_market_structure(df):
     """Analyze market structure using higher highs and lower lows."""
     # Find local maxima and minima
@@ -101,12 +136,83 @@ def analyze_market_structure(df):
     
     return "Undefined"
 
-def analyze_stock_advanced(alice, token, strategy, exchange='NSE'):
-    """Analyze stock using advanced strategies."""
+def analyze_market_structure_mtf(df, timeframes=('W',), key=None):
+    """
+    Analyze market structure on the daily bars and on higher timeframes
+    resampled locally from them (no extra fetch).
+
+    Returns:
+        dict: timeframe -> structure label, with 'D' for the input bars
+    """
+    structures = {'D': analyze_market_structure(df)}
+    for timeframe in timeframes:
+        structures[timeframe] = analyze_market_structure(get_timeframe(key, df, timeframe))
+    return structures
+
+def identify_patterns_mtf(df, timeframes=('W',), key=None):
+    """
+    Candlestick patterns on the daily bars and on higher timeframes resampled
+    locally from them (no extra fetch).
+
+    Returns:
+        dict: timeframe -> pattern names, with 'D' for the input bars
+    """
+    patterns = {'D': identify_candlestick_patterns(df)}
+    for timeframe in timeframes:
+        # The resampled bars may be shared through the cache; the pattern check adds columns
+        patterns[timeframe] = identify_candlestick_patterns(get_timeframe(key, df, timeframe).copy())
+    return patterns
+
+def is_timeframe_confirmed(structures):
+    """True when the daily trend is Uptrend/Downtrend and every higher timeframe agrees."""
+    daily = structures.get('D')
+    if daily not in ['Uptrend', 'Downtrend']:
+        return False
+    return all(structure == daily for structure in structures.values())
+
+def has_volume_surge(df, window=20, factor=1.5):
+    """Last volume above ``factor`` times its ``window``-bar average."""
+    return df['volume'].iloc[-1] > df['volume'].rolling(window).mean().iloc[-1] * factor
+
+def iter_token_results(analyze_token, tokens, max_workers=50):
+    """
+    Run ``analyze_token`` over tokens in parallel, yielding as each one finishes.
+
+    Yields:
+        tuple: (token, result, error) where error is the raised exception or None
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        future_to_token = {executor.submit(analyze_token, token): token for token in tokens}
+        for future in as_completed(future_to_token):
+            token = future_to_token[future]
+            try:
+                yield token, future.result(), None
+            except Exception as e:
+                yield token, None, e
+
+def analyze_stock_advanced(alice, token, strategy, exchange='NSE', raise_errors=False, bars=None):
+    """
+    Analyze stock using advanced strategies.
+
+    When ``bars`` is a dict, the fetched bars are stored in it under the token
+    so a cross-sectional stage can reuse them without fetching again.
+    """
     try:
-        instrument, df = get_historical_data(
-            alice, token, datetime.now() - timedelta(days=365), datetime.now(), "D", exchange
-        )
+        requirement = STRATEGY_REQUIREMENTS.get(strategy, DataRequirement(None))
+        # Pre-check on a short window; most stocks fail it and never fetch the
+        # full history. Not used while collecting bars for a cross-sectional stage.
+        if requirement.prefilter_bars and bars is None:
+            _, recent = get_history(
+                alice, token, history_days(requirement, prefilter=True), requirement.interval, exchange
+            )
+            if len(recent) >= requirement.prefilter_bars and not (
+                has_volume_surge(recent) and identify_candlestick_patterns(recent)
+            ):
+                return None
+
+        instrument, df = get_history(alice, token, history_days(requirement), requirement.interval, exchange)
+        if bars is not None:
+            bars[token] = df
         if len(df) < 100:
             return None
 
@@ -120,12 +226,29 @@ def analyze_stock_advanced(alice, token, strategy, exchange='NSE'):
             'Strength': 0
         }
 
-        # Analyze candlestick patterns
-        patterns = identify_candlestick_patterns(df)
+        # Cheap checks first: when a strategy's condition already fails its
+        # strength stays 0, so the heavier analyses below are skipped
+        volume_surge = has_volume_surge(df)
+        if strategy == "Price Action Breakout" and not volume_surge:
+            return None
+
+        # Analyze candlestick patterns on daily and weekly bars
+        pattern_sets = identify_patterns_mtf(df, ('W',), key=(exchange, token))
+        patterns, weekly_patterns = pattern_sets['D'], pattern_sets['W']
         result['Patterns'] = patterns
+        if strategy == "Price Action Breakout" and not patterns:
+            return None
+        result['Weekly_Patterns'] = weekly_patterns
+        # Patterns that show on the weekly candle too
+        confirmed_patterns = [pattern for pattern in patterns if pattern in weekly_patterns]
         
-        # Analyze market structure
-        result['Market_Structure'] = analyze_market_structure(df)
+        # Analyze market structure on daily and weekly bars
+        structures = analyze_market_structure_mtf(df, ('W',), key=(exchange, token))
+        result['Market_Structure'] = structures['D']
+        result['Weekly_Structure'] = structures['W']
+        timeframe_confirmed = is_timeframe_confirmed(structures)
+        if strategy == "Market Structure Analysis" and result['Market_Structure'] not in ['Uptrend', 'Downtrend']:
+            return None
         
         # Analyze volume profile
         volume_nodes = analyze_volume_profile(df)
@@ -134,8 +257,11 @@ def analyze_stock_advanced(alice, token, strategy, exchange='NSE'):
         # Calculate overall strength based on strategy
         if strategy == "Price Action Breakout":
             # Strong breakouts with volume confirmation
-            if patterns and df['volume'].iloc[-1] > df['volume'].rolling(20).mean().iloc[-1] * 1.5:
-                result['Strength'] = len(patterns) * 2
+            if patterns and volume_surge:
+                result['Strength'] = len(patterns) * 2 + len(confirmed_patterns)
+                # Weekly uptrend confirms the daily breakout
+                if result['Weekly_Structure'] == 'Uptrend':
+                    result['Strength'] += 2
                 
         elif strategy == "Volume Profile Analysis":
             # High volume nodes near current price
@@ -147,38 +273,109 @@ def analyze_stock_advanced(alice, token, strategy, exchange='NSE'):
             # Strong trend with confirmation
             if result['Market_Structure'] in ['Uptrend', 'Downtrend']:
                 result['Strength'] = 5
+                if timeframe_confirmed:
+                    result['Strength'] += 3
                 
         elif strategy == "Multi-Factor Analysis":
             # Combine all factors
             strength = 0
             strength += len(patterns) * 2  # Candlestick patterns
+            strength += len(confirmed_patterns)  # Patterns the weekly candle confirms
             strength += len(result['Volume_Nodes'])  # Volume nodes
             strength += 5 if result['Market_Structure'] in ['Uptrend', 'Downtrend'] else 0  # Market structure
+            strength += 3 if timeframe_confirmed else 0  # Weekly agrees with daily
             result['Strength'] = strength
 
         return result if result['Strength'] > 0 else None
 
     except Exception as e:
+        if raise_errors:
+            raise
         print(f"Error analyzing {token}: {e}")
         return None
 
-def analyze_all_tokens_advanced(alice, tokens, strategy, exchange='NSE'):
+def fill_universe_bars(alice, tokens, bars, exchange='NSE'):
+    """
+    Fetch the bars of tokens missing from ``bars`` (not analyzed in this run,
+    e.g. restored from a checkpoint or unchanged in a delta screen).
+    """
+    missing = [token for token in tokens if token not in bars]
+    for token, fetched, error in iter_token_results(
+        lambda t: get_history(alice, t, FULL_HISTORY_DAYS, "D", exchange)[1], missing
+    ):
+        if error is None:
+            bars[token] = fetched
+        else:
+            print(f"Could not fetch bars for {token}: {error}")
+
+def apply_cross_sectional_stage(alice, tokens, token_results, bars, exchange='NSE'):
+    """
+    Rank qualifying tokens against the whole universe (relative strength,
+    breadth, sector rotation) in one vectorized pass.
+
+    Args:
+        alice: AliceBlue API instance
+        tokens: The full universe that was screened
+        token_results: List of (token, result) for the qualifying tokens
+        bars: token -> DataFrame for the universe; missing tokens are fetched
+
+    Returns:
+        list: (token, result) pairs with the factor columns joined on
+    """
+    now = broker_now(alice)
+    fill_universe_bars(alice, tokens, bars, exchange)
+    panel = build_close_panel(bars)
+    if panel.empty:
+        return token_results
+    benchmark = fetch_benchmark(alice, panel.index[0].to_pydatetime(), now)
+    factors, breadth, _ = compute_cross_sectional_factors(
+        panel, benchmark=benchmark, sectors=load_sector_map(exchange), exchange=exchange
+    )
+    return apply_cross_sectional_factors(token_results, factors, breadth)
+
+def needs_universe_bars(strategy, max_per_cluster=None):
+    """Whether screening ``strategy`` needs every token's bars after the per-token pass."""
+    return strategy in CROSS_SECTIONAL_STRATEGIES or bool(max_per_cluster)
+
+def finalize_advanced_results(alice, tokens, token_results, bars, strategy, exchange='NSE',
+                              max_per_cluster=None):
+    """
+    Universe-wide stages run after the per-token pass.
+
+    Args:
+        token_results: List of (token, result) for the qualifying tokens
+        bars: token -> DataFrame collected while screening; tokens not
+            analyzed in this run are fetched first
+        max_per_cluster: If set, keep only this many of the strongest hits per
+            correlation cluster
+
+    Returns:
+        list: (token, result) pairs
+    """
+    fill_universe_bars(alice, tokens, bars, exchange)
+    if strategy in CROSS_SECTIONAL_STRATEGIES:
+        token_results = apply_cross_sectional_stage(alice, tokens, token_results, bars, exchange)
+    if max_per_cluster:
+        clusters = cluster_tokens(build_close_panel(bars))
+        token_results = diversify_results(token_results, clusters, max_per_cluster)
+    return token_results
+
+def analyze_all_tokens_advanced(alice, tokens, strategy, exchange='NSE', max_per_cluster=None):
     """Analyze all tokens using advanced strategies in parallel."""
-    results = []
-    with ThreadPoolExecutor(max_workers=50) as executor:
-        future_to_token = {
-            executor.submit(analyze_stock_advanced, alice, token, strategy, exchange): token
-            for token in tokens
-        }
-        for future in as_completed(future_to_token):
-            token = future_to_token[future]
-            try:
-                result = future.result()
-                if result:
-                    results.append(result)
-            except Exception as e:
-                print(f"Error processing {token}: {e}")
-    return results
+    token_results = []
+    bars = {} if needs_universe_bars(strategy, max_per_cluster) else None
+    for token, result, error in iter_token_results(
+        lambda t: analyze_stock_advanced(alice, t, strategy, exchange, bars=bars), tokens
+    ):
+        if error is not None:
+            print(f"Error processing {token}: {error}")
+        elif result:
+            token_results.append((token, result))
+    if bars is not None:
+        token_results = finalize_advanced_results(
+            alice, tokens, token_results, bars, strategy, exchange, max_per_cluster
+        )
+    return [result for _, result in token_results]
 
 def analyze_price_movement(df, duration_days, target_percentage, direction='up'):
     """
@@ -211,7 +408,8 @@ def analyze_price_movement(df, duration_days, target_percentage, direction='up')
     
     return percentage_change, met_criteria
 
-def analyze_stock_custom(alice, token, duration_days, target_percentage, direction='up', exchange='NSE'):
+def analyze_stock_custom(alice, token, duration_days, target_percentage, direction='up', exchange='NSE',
+                         raise_errors=False):
     """
     Analyze stock based on custom price movement criteria.
     
@@ -222,20 +420,14 @@ def analyze_stock_custom(alice, token, duration_days, target_percentage, directi
         target_percentage: Target percentage change
         direction: 'up' or 'down' for price movement direction
         exchange: 'NSE' or 'BSE'
+        raise_errors: Re-raise failures instead of printing them
     
     Returns:
         dict: Analysis results or None if criteria not met
     """
     try:
-        # Get more historical data than needed to ensure we have enough
-        lookback_days = max(duration_days * 2, 365)  # At least double the duration or 1 year
-        instrument, df = get_historical_data(
-            alice, token, 
-            datetime.now() - timedelta(days=lookback_days), 
-            datetime.now(), 
-            "D", 
-            exchange
-        )
+        requirement = custom_requirement(duration_days)
+        instrument, df = get_history(alice, token, history_days(requirement), requirement.interval, exchange)
         
         if len(df) < duration_days:
             return None
@@ -250,7 +442,7 @@ def analyze_stock_custom(alice, token, duration_days, target_percentage, directi
 
         # Additional analysis for context
         volume_trend = df['volume'].iloc[-5:].mean() > df['volume'].iloc[-20:].mean()
-        volatility = df['close'].pct_change().std() * 100
+        volatility = df['close'].iloc[-requirement.bars:].pct_change().std() * 100
         
         result = {
             'Name': instrument.symbol,
@@ -267,30 +459,20 @@ def analyze_stock_custom(alice, token, duration_days, target_percentage, directi
         return result
 
     except Exception as e:
+        if raise_errors:
+            raise
         print(f"Error analyzing {token}: {e}")
         return None
 
 def analyze_all_tokens_custom(alice, tokens, duration_days, target_percentage, direction='up', exchange='NSE'):
     """Analyze all tokens using custom criteria in parallel."""
     results = []
-    with ThreadPoolExecutor(max_workers=50) as executor:
-        future_to_token = {
-            executor.submit(
-                analyze_stock_custom, 
-                alice, 
-                token, 
-                duration_days, 
-                target_percentage, 
-                direction, 
-                exchange
-            ): token for token in tokens
-        }
-        for future in as_completed(future_to_token):
-            token = future_to_token[future]
-            try:
-                result = future.result()
-                if result:
-                    results.append(result)
-            except Exception as e:
-                print(f"Error processing {token}: {e}")
+    for token, result, error in iter_token_results(
+        lambda t: analyze_stock_custom(alice, t, duration_days, target_percentage, direction, exchange),
+        tokens
+    ):
+        if error is not None:
+            print(f"Error processing {token}: {error}")
+        elif result:
+            results.append(result)
     return results 
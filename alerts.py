@@ -0,0 +1,175 @@
+import bisect
+import itertools
+import threading
+
+LEVEL_KINDS = ('support', 'resistance')
+
+_level_listeners = []
+_listeners_lock = threading.Lock()
+
+def subscribe_levels(callback):
+    """Register ``callback(exchange, token, kind, prices)``, called whenever a scan recomputes levels."""
+    with _listeners_lock:
+        _level_listeners.append(callback)
+
+def unsubscribe_levels(callback):
+    with _listeners_lock:
+        if callback in _level_listeners:
+            _level_listeners.remove(callback)
+
+def publish_levels(exchange, token, kind, prices):
+    """Announce the current support or resistance prices of a token (empty clears them)."""
+    with _listeners_lock:
+        listeners = list(_level_listeners)
+    for callback in listeners:
+        try:
+            callback(exchange, token, kind, prices)
+        except Exception as e:
+            print(f"Error publishing {kind} levels for {exchange}:{token}: {e}")
+
+class AlertEngine:
+    """
+    Standing "price within X% of a level" alerts over many tokens.
+
+    Tokens are identified by (exchange, token): NSE and BSE reuse some token
+    numbers. Levels come from ``set_levels`` or, after ``follow_scans``, from
+    the support/resistance screens ("EMA, RSI & Support Zone (Buy)" and
+    "EMA, RSI & Resistance Zone (Sell)") whenever they run in this process,
+    e.g. in the after-close warm-up or a screening service request. Prices
+    are fed in with ``on_price``/``on_prices``.
+
+    Each token's levels are kept sorted. For one tolerance t, level L is hit when
+    L*(1-t) <= price <= L*(1+t); both bounds grow with L, so the hit levels are a
+    contiguous slice of the sorted levels found with two bisections. Indexes are
+    cached per (token, kind, tolerance) and rebuilt only when that token's levels
+    change. Alerts fire when a level enters the zone, not on every tick inside it.
+    """
+
+    def __init__(self):
+        self._levels = {}
+        self._alerts = {}
+        self._alerts_by_token = {}
+        self._index = {}
+        self._inside = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.RLock()
+
+    def set_levels(self, exchange, token, kind, prices):
+        """Replace a token's support or resistance levels."""
+        if kind not in LEVEL_KINDS:
+            raise ValueError(f"Unknown level kind: {kind}")
+        key = (exchange, token)
+        with self._lock:
+            self._levels.setdefault(key, {})[kind] = sorted(float(p) for p in prices)
+            for index_key in [k for k in self._index if k[0] == key]:
+                del self._index[index_key]
+
+    def levels(self, exchange, token):
+        with self._lock:
+            return {kind: list(prices) for kind, prices in self._levels.get((exchange, token), {}).items()}
+
+    def follow_scans(self):
+        """Keep levels in sync with every scan that publishes them (call before the scans run)."""
+        subscribe_levels(self.set_levels)
+
+    def stop_following(self):
+        unsubscribe_levels(self.set_levels)
+
+    def add_alert(self, exchange, token, tolerance_pct=1.0, kind='support', callback=None):
+        """
+        Alert when ``token`` trades within ``tolerance_pct`` percent of one of its levels.
+
+        Args:
+            exchange: 'NSE' or 'BSE'
+            token: Instrument token
+            tolerance_pct: Zone half-width as a percentage of the level
+            kind: 'support', 'resistance' or 'any'
+            callback: Optional ``callback(trigger)`` called for each new trigger
+
+        Returns:
+            int: Alert id
+        """
+        if kind not in LEVEL_KINDS + ('any',):
+            raise ValueError(f"Unknown alert kind: {kind}")
+        with self._lock:
+            alert_id = next(self._ids)
+            self._alerts[alert_id] = {
+                'key': (exchange, token),
+                'kind': kind,
+                'tolerance': tolerance_pct / 100,
+                'callback': callback
+            }
+            self._alerts_by_token.setdefault((exchange, token), set()).add(alert_id)
+            self._inside[alert_id] = set()
+            return alert_id
+
+    def remove_alert(self, alert_id):
+        with self._lock:
+            alert = self._alerts.pop(alert_id, None)
+            if alert:
+                self._alerts_by_token[alert['key']].discard(alert_id)
+                self._inside.pop(alert_id, None)
+
+    def _get_index(self, key, kind, tolerance):
+        index_key = (key, kind, tolerance)
+        index = self._index.get(index_key)
+        if index is None:
+            levels = self._levels.get(key, {})
+            if kind == 'any':
+                tagged = sorted(
+                    (price, level_kind) for level_kind in LEVEL_KINDS for price in levels.get(level_kind, [])
+                )
+            else:
+                tagged = [(price, kind) for price in levels.get(kind, [])]
+            index = (
+                [price * (1 - tolerance) for price, _ in tagged],
+                [price * (1 + tolerance) for price, _ in tagged],
+                tagged
+            )
+            self._index[index_key] = index
+        return index
+
+    def on_price(self, exchange, token, price):
+        """
+        Check a new price for ``token`` against its alerts.
+
+        Returns:
+            list: New triggers as dicts with alert_id, exchange, token, kind, level, price and distance_pct
+        """
+        key = (exchange, token)
+        triggers = []
+        with self._lock:
+            for alert_id in self._alerts_by_token.get(key, ()):
+                alert = self._alerts[alert_id]
+                lows, highs, tagged = self._get_index(key, alert['kind'], alert['tolerance'])
+                start = bisect.bisect_left(highs, price)
+                end = bisect.bisect_right(lows, price)
+                hit = set(tagged[start:end])
+                for level, kind in sorted(hit - self._inside[alert_id]):
+                    triggers.append({
+                        'alert_id': alert_id,
+                        'exchange': exchange,
+                        'token': token,
+                        'kind': kind,
+                        'level': level,
+                        'price': price,
+                        'distance_pct': (price - level) / level * 100,
+                        'callback': alert['callback']
+                    })
+                self._inside[alert_id] = hit
+
+        for trigger in triggers:
+            callback = trigger.pop('callback')
+            if callback:
+                try:
+                    callback(trigger)
+                except Exception as e:
+                    print(f"Error in alert {trigger['alert_id']} callback: {e}")
+        return triggers
+
+    def on_prices(self, prices):
+        """Check a batch of (exchange, token) -> price updates; returns all new triggers."""
+        triggers = []
+        for (exchange, token), price in prices.items():
+            triggers.extend(self.on_price(exchange, token, price))
+        return triggers
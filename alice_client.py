@@ -1,12 +1,38 @@
 import os
 import json
 import datetime
+import threading
+import importlib.metadata
+import requests
 from pya3 import Aliceblue
 from functools import lru_cache
 import pandas as pd
+from bar_decoder import decode_historical, bars_to_frame
+from timeframes import clear_timeframe_cache
+from broker_backend import CassetteStore, RecordingAlice, ReplayAlice, SyntheticAlice, CASSETTE_DIR
 
 API_FILE = "api_credentials.json"
 
+# Broker backend: "live" (default), "record" (live, saving responses to the
+# cassette store), "replay" (serve the cassette store, no network) or
+# "synthetic" (generated bars after BROKER_LATENCY seconds, no network).
+# BROKER_REPLAY_DATE=YYYY-MM-DD replays the screen as of that day.
+BROKER_BACKEND = os.environ.get("BROKER_BACKEND", "live")
+BROKER_CASSETTE_DIR = os.environ.get("BROKER_CASSETTE_DIR", CASSETTE_DIR)
+BROKER_REPLAY_DATE = os.environ.get("BROKER_REPLAY_DATE")
+BROKER_LATENCY = float(os.environ.get("BROKER_LATENCY", "0"))
+
+# Process-wide daily bar cache shared by every screen, keyed by
+# (exchange, token, interval). Entries fetched after the close stay valid for
+# the rest of the day; ones fetched during the session expire after a TTL
+# because the last candle is still moving. Fetch times are kept in IST, the
+# exchange's time zone, whatever the host's time zone is.
+IST = datetime.timezone(datetime.timedelta(hours=5, minutes=30), "IST")
+MARKET_CLOSE = datetime.time(15, 30)
+SESSION_CACHE_TTL = datetime.timedelta(minutes=5)
+_history_cache = {}
+_history_lock = threading.Lock()
+
 def save_credentials(user_id, api_key):
     """ Save AliceBlue credentials in a file for the day. """
     credentials = {
@@ -30,25 +56,215 @@ def load_credentials():
         print(f"Error loading credentials: {e}")
     return None, None
 
-def initialize_alice():
-    """ Initialize AliceBlue API session with stored credentials. """
+def initialize_alice(backend=None):
+    """ Initialize the broker session for the configured backend (see BROKER_BACKEND). """
+    backend = backend or BROKER_BACKEND
+    if backend == "replay":
+        as_of = datetime.date.fromisoformat(BROKER_REPLAY_DATE) if BROKER_REPLAY_DATE else None
+        return ReplayAlice(CassetteStore(BROKER_CASSETTE_DIR), as_of=as_of)
+    if backend == "synthetic":
+        return SyntheticAlice(latency=BROKER_LATENCY)
+    if backend not in ("live", "record"):
+        raise Exception(f"Unknown broker backend: {backend}")
+
     user_id, api_key = load_credentials()
     if not user_id or not api_key:
         raise Exception("AliceBlue credentials not found. Please log in.")
 
     alice = Aliceblue(user_id=user_id, api_key=api_key)
     alice.get_session_id()
+    if backend == "record":
+        return RecordingAlice(alice, CassetteStore(BROKER_CASSETTE_DIR))
     return alice
 
+def _pya3_version():
+    try:
+        return importlib.metadata.version("pya3")
+    except importlib.metadata.PackageNotFoundError:
+        return None
+
+# The direct chart request below mirrors pya3's get_historical and uses its
+# private helpers, so it is only taken for pya3 versions it was checked against
+DIRECT_CHART_PYA3_VERSIONS = ("1.0.30",)
+PYA3_VERSION = _pya3_version()
+CHART_REQUEST_TIMEOUT = 30
+
+def fetch_historical_bars(alice, instrument, from_date, to_date, interval="D", indices=False):
+    """
+    Fetch historical data as typed columns (see ``bar_decoder.decode_historical``).
+
+    For a live Aliceblue session on a known pya3 version the chart API
+    response is decoded directly, skipping the DataFrame pya3 would build from
+    it; anything else goes through the public ``get_historical``.
+    """
+    if not isinstance(alice, Aliceblue) or PYA3_VERSION not in DIRECT_CHART_PYA3_VERSIONS:
+        return decode_historical(alice.get_historical(instrument, from_date, to_date, interval, indices))
+
+    payload = json.dumps({
+        "token": str(instrument.token),
+        "exchange": instrument.exchange if not indices else f"{instrument.exchange}::index",
+        "from": str(int(from_date.timestamp())) + '000',
+        "to": str(int(to_date.timestamp())) + '000',
+        "resolution": interval
+    })
+    headers = {
+        "X-SAS-Version": "2.0",
+        "User-Agent": alice._user_agent(),
+        "Authorization": alice._user_authorization(),
+        'Content-Type': 'application/json'
+    }
+    response = requests.post(
+        alice.base_url + "chart/history", data=payload, headers=headers, timeout=CHART_REQUEST_TIMEOUT
+    )
+    return decode_historical(response.json())
+
 @lru_cache(maxsize=1000)
 def get_cached_historical_data(alice, token, from_date, to_date, interval="D", exchange='NSE'):
     """Cached version of historical data fetching."""
     exchange_name = 'BSE (1)' if exchange == 'BSE' else 'NSE'
     instrument = alice.get_instrument_by_token(exchange_name, token)
-    historical_data = alice.get_historical(instrument, from_date, to_date, interval)
-    df = pd.DataFrame(historical_data).dropna()
+    df = bars_to_frame(fetch_historical_bars(alice, instrument, from_date, to_date, interval))
     return instrument, df
 
+def market_now():
+    """Current time in IST."""
+    return datetime.datetime.now(IST)
+
+def broker_now(alice):
+    """
+    End of the window a screen should request: the backend's own clock when
+    it has one (a replay of a past day), otherwise the host's local time.
+    """
+    now = getattr(alice, 'now', None)
+    return now() if callable(now) else datetime.datetime.now()
+
+def _is_fresh(entry, now):
+    fetched_at = entry['fetched_at']
+    if fetched_at.date() != now.date():
+        return False
+    return fetched_at.time() >= MARKET_CLOSE or now - fetched_at < SESSION_CACHE_TTL
+
+def get_history(alice, token, days=365, interval="D", exchange='NSE'):
+    """
+    Fetch the last ``days`` calendar days of bars through the shared cache.
+
+    A fresh cached window that is at least as long is sliced instead of
+    fetched again; a fresh shorter one (e.g. a pre-check's) is extended with
+    only the older bars it lacks. The instrument is looked up once per token.
+    The returned DataFrame is a fresh copy, so callers may add indicator
+    columns to it.
+
+    Returns:
+        tuple: (instrument, DataFrame)
+    """
+    key = (exchange, token, interval)
+    now = broker_now(alice)
+    with _history_lock:
+        entry = _history_cache.get(key)
+    fresh = entry is not None and _is_fresh(entry, market_now())
+    if fresh and entry['days'] < days and len(entry['df']):
+        df = entry['df']
+        first = df['datetime'].iloc[0].to_pydatetime()
+        older = bars_to_frame(fetch_historical_bars(
+            alice, entry['instrument'], now - datetime.timedelta(days=days),
+            first - datetime.timedelta(seconds=1), interval
+        ))
+        entry = dict(entry, days=days, df=pd.concat([older[older['datetime'] < first], df], ignore_index=True))
+        with _history_lock:
+            _history_cache[key] = entry
+    elif not (fresh and entry['days'] >= days):
+        if entry is not None:
+            instrument = entry['instrument']
+        else:
+            exchange_name = 'BSE (1)' if exchange == 'BSE' else 'NSE'
+            instrument = alice.get_instrument_by_token(exchange_name, token)
+        bars = fetch_historical_bars(alice, instrument, now - datetime.timedelta(days=days), now, interval)
+        entry = {
+            'fetched_at': market_now(),
+            'days': days,
+            'instrument': instrument,
+            'df': bars_to_frame(bars)
+        }
+        with _history_lock:
+            _history_cache[key] = entry
+
+    df = entry['df']
+    cutoff = now - datetime.timedelta(days=days)
+    return entry['instrument'], df[df['datetime'] >= cutoff].reset_index(drop=True)
+
+def fetch_latest_bars(alice, token, days, interval="D", exchange='NSE'):
+    """
+    Fetch only the last ``days`` of bars, bypassing the cache: a cheap probe
+    for whether a token has new data.
+
+    Returns:
+        tuple: (instrument, columns)
+    """
+    key = (exchange, token, interval)
+    with _history_lock:
+        entry = _history_cache.get(key)
+    if entry:
+        instrument = entry['instrument']
+    else:
+        exchange_name = 'BSE (1)' if exchange == 'BSE' else 'NSE'
+        instrument = alice.get_instrument_by_token(exchange_name, token)
+    now = broker_now(alice)
+    return instrument, fetch_historical_bars(alice, instrument, now - datetime.timedelta(days=days), now, interval)
+
+def extend_history(token, columns, interval="D", exchange='NSE'):
+    """
+    Splice freshly fetched bars onto a cached window, replacing the bars they
+    overlap, so ``get_history`` serves them without refetching the full window.
+
+    Returns:
+        bool: True if a cached window was extended; False if there was none or
+        the new bars do not overlap it (the entry is then dropped)
+    """
+    key = (exchange, token, interval)
+    new_bars = bars_to_frame(columns)
+    with _history_lock:
+        entry = _history_cache.get(key)
+        if not entry or new_bars.empty:
+            return False
+        df = entry['df']
+        first = new_bars['datetime'].iloc[0]
+        if df.empty or df['datetime'].iloc[-1] < first:
+            # Bars between the cached window and the new ones would be missing
+            del _history_cache[key]
+            return False
+        _history_cache[key] = dict(
+            entry,
+            fetched_at=market_now(),
+            df=pd.concat([df[df['datetime'] < first], new_bars], ignore_index=True)
+        )
+    return True
+
+def invalidate_history(token=None, exchange=None, fetched_before=None):
+    """
+    Drop cached bars so the next request refetches them.
+
+    Args:
+        token: Only this token (default: all tokens)
+        exchange: Only this exchange (default: both)
+        fetched_before: Only entries fetched before this datetime (naive
+            datetimes are taken as host local time)
+    """
+    if fetched_before is not None:
+        fetched_before = fetched_before.astimezone(IST)
+    with _history_lock:
+        for key in list(_history_cache):
+            entry_exchange, entry_token, _ = key
+            if token is not None and entry_token != token:
+                continue
+            if exchange is not None and entry_exchange != exchange:
+                continue
+            if fetched_before is not None and _history_cache[key]['fetched_at'] >= fetched_before:
+                continue
+            del _history_cache[key]
+    # Resampled bars are rebuilt on next use
+    clear_timeframe_cache(token, exchange)
+
 def clear_cache():
     """Clear the historical data cache."""
     get_cached_historical_data.cache_clear()
+    invalidate_history()
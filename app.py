@@ -5,10 +5,10 @@ from concurrent.futures import ThreadPoolExecutor, as_completed
 from multiprocessing import Pool, cpu_count
 from functools import partial
 from alice_client import initialize_alice, save_credentials, load_credentials
-from advanced_analysis import (
-    analyze_all_tokens_advanced,
-    analyze_all_tokens_custom
-)
+from advanced_analysis import analyze_all_tokens_advanced
+from scan_jobs import advanced_scan_job, custom_scan_job, filtered_scan_job, prune_checkpoints
+from delta_screen import DeltaScreen
+from warmup import WarmupScheduler, get_warm_results
 from stock_lists import STOCK_LISTS
 from utils import generate_tradingview_link
 
@@ -140,6 +140,15 @@ except Exception as e:
     st.error(f"Failed to initialize AliceBlue API: {e}")
     alice = None
 
+@st.cache_resource
+def start_warmup_scheduler():
+    """One after-close prefetch/precompute scheduler per server process."""
+    scheduler = WarmupScheduler()
+    scheduler.start()
+    return scheduler
+
+start_warmup_scheduler()
+
 @st.cache_data(ttl=300)
 def fetch_screened_stocks(tokens, strategy):
     try:
@@ -158,7 +167,9 @@ def clean_and_display_data(data, strategy):
     df["Close"] = df["Close"].astype(float).round(2)
     df["Strength"] = df["Strength"].astype(float).round(2)
 
-    if strategy == "Custom Price Movement":
+    if strategy == "Custom Filter":
+        df["Volume"] = df["Volume"].astype(float).round(2)
+    elif strategy == "Custom Price Movement":
         df["Start_Price"] = df["Start_Price"].astype(float).round(2)
         df["Percentage_Change"] = df["Percentage_Change"].astype(float).round(2)
         df["Volatility"] = df["Volatility"].astype(float).round(2)
@@ -198,7 +209,8 @@ with col2:
             "Volume Profile Analysis",
             "Market Structure Analysis",
             "Multi-Factor Analysis",
-            "Custom Price Movement"
+            "Custom Price Movement",
+            "Custom Filter"
         ],
         help="Choose a technical analysis strategy"
     )
@@ -225,7 +237,7 @@ strategy_descriptions = {
     "Multi-Factor Analysis": """
         - Combines price action, volume, and market structure
         - Includes relative strength analysis
-        - Considers sector rotation
+        - Considers sector rotation (when a sector map is provided)
         - Integrates market breadth indicators
     """,
     "Custom Price Movement": """
@@ -233,6 +245,11 @@ strategy_descriptions = {
         - Set your own duration and percentage targets
         - Track stocks moving up or down by your specified amount
         - Includes volume trend and volatility analysis
+    """,
+    "Custom Filter": """
+        - Combine conditions on RSI, EMAs, % change, volume ratio, patterns and support distance
+        - Use `and`, `or`, `not` and parentheses
+        - Cheap conditions are checked first, so heavy analyses only run on stocks that pass them
     """
 }
 
@@ -256,21 +273,99 @@ if strategy == "Custom Price Movement":
             "Direction", ["up", "down"], help="Price movement direction"
         )
 
+if strategy == "Custom Filter":
+    filter_expression = st.text_input(
+        "Filter Expression",
+        value="volume_ratio(20) > 1.5 and 40 <= rsi <= 65 and ema(50) > ema(200)",
+        help="Indicators: close, volume, pct_change(days), volume_ratio(window), ema(span), "
+             "ema_cross(fast, slow, within), rsi, support_distance, resistance_distance, "
+             "pattern('Hammer'), weekly_pattern('Hammer'), market_structure, weekly_structure"
+    )
+
+max_per_cluster = None
+if strategy not in ["Custom Price Movement", "Custom Filter"]:
+    if st.checkbox(
+        "Diversify results",
+        help="Show only the strongest stock from each group of highly correlated stocks"
+    ):
+        max_per_cluster = 1
+
+delta_mode = st.checkbox(
+    "Show changes since last run",
+    help="Re-analyze only stocks with new data and list new, dropped and changed results"
+)
+
 if st.button("Start Screening", use_container_width=True):
     tokens = available_lists.get(selected_list, [])
     if not tokens:
         st.warning(f"No stocks found for {selected_list}.")
     else:
-        with st.spinner("Analyzing stocks..."):
-            if strategy == "Custom Price Movement":
-                screened_stocks = analyze_all_tokens_custom(
-                    alice, tokens, duration_days, target_percentage, direction,
-                    exchange=st.session_state.selected_exchange
-                )
+        # Served from the after-close warm-up when it already covered this screen
+        warm_results = None
+        if strategy not in ["Custom Price Movement", "Custom Filter"]:
+            warm_results = get_warm_results(st.session_state.selected_exchange, selected_list, strategy)
+        if max_per_cluster or delta_mode:
+            warm_results = None
+
+        # Checkpointed scan: a rerun or restart resumes where the last attempt stopped
+        prune_checkpoints()
+        if warm_results is not None:
+            job = None
+        elif strategy == "Custom Filter":
+            try:
+                job = filtered_scan_job(alice, tokens, filter_expression, exchange=st.session_state.selected_exchange)
+            except ValueError as e:
+                st.error(str(e))
+                st.stop()
+        elif strategy == "Custom Price Movement":
+            job = custom_scan_job(
+                alice, tokens, duration_days, target_percentage, direction,
+                exchange=st.session_state.selected_exchange
+            )
+        else:
+            job = advanced_scan_job(
+                alice, tokens, strategy,
+                exchange=st.session_state.selected_exchange,
+                max_per_cluster=max_per_cluster
+            )
+        failed = {}
+        if job is None:
+            screened_stocks = warm_results
+        elif delta_mode:
+            with st.spinner("Checking for new data..."):
+                report = DeltaScreen.from_scan_job(alice, job, exchange=st.session_state.selected_exchange).run()
+            screened_stocks = report['results']
+            failed = report['failed']
+            if report['first_run']:
+                st.info("First run of this screen: changes will be shown from the next run.")
             else:
-                screened_stocks = analyze_all_tokens_advanced(
-                    alice, tokens, strategy,
-                    exchange=st.session_state.selected_exchange
+                st.info(
+                    f"{report['reanalyzed']} of {len(tokens)} stocks had new data: "
+                    f"{len(report['new'])} new, {len(report['dropped'])} dropped, "
+                    f"{len(report['changed'])} strength changes."
+                )
+                if report['new']:
+                    st.markdown("**New:** " + ", ".join(r['Name'] for r in report['new']))
+                if report['dropped']:
+                    st.markdown("**Dropped:** " + ", ".join(r['Name'] for r in report['dropped']))
+                if report['changed']:
+                    st.dataframe(pd.DataFrame(report['changed']), hide_index=True)
+        else:
+            # The checkpoint only resumes an interrupted scan; a finished one is
+            # rerun so every press screens fresh data
+            if job.is_finished and not job.failed:
+                job.discard()
+            progress = st.progress(0.0)
+            with st.spinner("Analyzing stocks..."):
+                screened_stocks = job.run(
+                    retry_failed=True,
+                    on_progress=lambda done, total: progress.progress(done / total)
                 )
+            failed = job.failed
+        if failed:
+            st.warning(
+                f"{len(failed)} of {len(tokens)} stocks could not be analyzed. "
+                "Press Start Screening again to retry only those."
+            )
         df = clean_and_display_data(screened_stocks, strategy)
         safe_display(df, strategy)
@@ -0,0 +1,99 @@
+import numpy as np
+import pandas as pd
+
+# Columnar layout every decoded history shares, with explicit dtypes so
+# nothing is inferred per row.
+BAR_COLUMNS = ['datetime', 'open', 'high', 'low', 'close', 'volume']
+PRICE_COLUMNS = BAR_COLUMNS[1:]
+BAR_DTYPES = {
+    'datetime': 'datetime64[ns]',
+    'open': np.float64,
+    'high': np.float64,
+    'low': np.float64,
+    'close': np.float64,
+    'volume': np.float64
+}
+# The broker's chart API calls the timestamp 'time'; pya3 renames it to 'datetime'
+FIELD_ALIASES = {'datetime': ('datetime', 'time')}
+
+def _decode_timestamps(values):
+    """Timestamps from ISO strings, epoch seconds/milliseconds or datetimes."""
+    values = np.asarray(values)
+    if values.dtype.kind == 'M':
+        return values.astype('datetime64[ns]')
+    if values.dtype.kind in 'iuf':
+        # Epoch values: the chart API reports milliseconds, older payloads seconds
+        unit = 'ms' if np.nanmax(np.abs(values)) > 1e11 else 's'
+        return pd.to_datetime(values, unit=unit).to_numpy(dtype='datetime64[ns]')
+    try:
+        return values.astype('datetime64[ns]')
+    except ValueError:
+        return pd.to_datetime(values).to_numpy(dtype='datetime64[ns]')
+
+def _empty_columns():
+    return {name: np.empty(0, dtype=BAR_DTYPES[name]) for name in BAR_COLUMNS}
+
+def _field(source, name):
+    for alias in FIELD_ALIASES.get(name, (name,)):
+        if alias in source:
+            return source[alias]
+    raise KeyError(f"Historical data is missing the '{name}' field")
+
+def _rows_to_columns(rows):
+    """Transpose a list of row dicts into one list per field."""
+    first = rows[0]
+    keys = {name: next(a for a in FIELD_ALIASES.get(name, (name,)) if a in first) for name in BAR_COLUMNS}
+    return {name: [row.get(key) for row in rows] for name, key in keys.items()}
+
+def decode_historical(payload):
+    """
+    Decode a historical-data response into typed NumPy columns.
+
+    Accepts the raw chart API response (``{'stat': ..., 'result': [...]}``),
+    its list of row dicts, a dict of columns, or the DataFrame pya3 returns.
+    Rows with a missing timestamp or any missing/non-finite OHLCV value are dropped.
+
+    Returns:
+        dict: column name -> NumPy array (datetime64[ns] timestamps, float64 values)
+
+    Raises:
+        Exception: If the broker reported an error instead of data
+    """
+    if isinstance(payload, dict) and payload.get('stat') == 'Not_Ok':
+        raise Exception(f"Historical data request failed: {payload.get('emsg', payload)}")
+    if isinstance(payload, dict) and 'result' in payload:
+        payload = payload['result']
+
+    if payload is None or len(payload) == 0:
+        return _empty_columns()
+    if isinstance(payload, list):
+        source = _rows_to_columns(payload)
+    else:
+        source = payload
+
+    columns = {'datetime': _decode_timestamps(_field(source, 'datetime'))}
+    for name in PRICE_COLUMNS:
+        values = _field(source, name)
+        if isinstance(values, pd.Series):
+            columns[name] = pd.to_numeric(values, errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+        else:
+            try:
+                columns[name] = np.asarray(values, dtype=np.float64)
+            except (TypeError, ValueError):
+                columns[name] = pd.to_numeric(pd.Series(values), errors='coerce').to_numpy(dtype=np.float64)
+
+    valid = ~np.isnat(columns['datetime'])
+    for name in PRICE_COLUMNS:
+        valid &= np.isfinite(columns[name])
+    if not valid.all():
+        columns = {name: values[valid] for name, values in columns.items()}
+    return columns
+
+def bars_to_frame(columns):
+    """Wrap decoded columns in a DataFrame without copying or re-inferring dtypes."""
+    return pd.DataFrame(columns, columns=BAR_COLUMNS, copy=False)
+
+def bars_to_arrow(columns):
+    """Decoded columns as a pyarrow Table, for Arrow consumers."""
+    import pyarrow as pa
+    return pa.table({name: columns[name] for name in BAR_COLUMNS})
@@ -0,0 +1,247 @@
+import os
+import re
+import json
+import time
+import random
+import datetime
+import threading
+import numpy as np
+from bar_decoder import BAR_COLUMNS, decode_historical, bars_to_frame
+from synthetic_data import Instrument, synthetic_bars, synthetic_instrument
+
+CASSETTE_DIR = "cassettes"
+
+def _safe_name(value):
+    return re.sub(r'[^A-Za-z0-9_.-]+', '_', str(value))
+
+class CassetteStore:
+    """
+    Local store of recorded broker responses.
+
+    Layout::
+
+        <directory>/instruments.json                        exchange:token -> instrument fields
+        <directory>/bars/<exchange>/<interval>/<token>.npz  compressed OHLCV columns
+
+    Bars recorded for the same instrument and interval are merged by
+    timestamp, so repeated recordings extend one series instead of piling up.
+    """
+
+    def __init__(self, directory=CASSETTE_DIR):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._instruments = None
+        self._bars = {}
+
+    def _instruments_path(self):
+        return os.path.join(self.directory, "instruments.json")
+
+    def _bars_path(self, exchange, interval, token):
+        return os.path.join(
+            self.directory, "bars", _safe_name(exchange), _safe_name(interval), f"{_safe_name(token)}.npz"
+        )
+
+    def _load_instruments(self):
+        if self._instruments is None:
+            self._instruments = {}
+            if os.path.exists(self._instruments_path()):
+                with open(self._instruments_path(), "r") as f:
+                    self._instruments = json.load(f)
+        return self._instruments
+
+    def get_instrument(self, exchange, token):
+        with self._lock:
+            fields = self._load_instruments().get(f"{exchange}:{token}")
+        return Instrument(**fields) if fields else None
+
+    def find_instrument(self, exchange, symbol):
+        with self._lock:
+            for key, fields in self._load_instruments().items():
+                if key.startswith(f"{exchange}:") and fields['symbol'] == symbol:
+                    return Instrument(**fields)
+        return None
+
+    def put_instrument(self, exchange, instrument):
+        # pya3 reads the contract master with pandas, so token and lot_size are NumPy scalars
+        fields = {
+            name: value.item() if isinstance(value, np.generic) else value
+            for name, value in zip(Instrument._fields, instrument)
+        }
+        fields['expiry'] = None if fields['expiry'] is None else str(fields['expiry'])
+        key = f"{exchange}:{fields['token']}"
+        with self._lock:
+            instruments = self._load_instruments()
+            if instruments.get(key) == fields:
+                return
+            updated = {**instruments, key: fields}
+            os.makedirs(self.directory, exist_ok=True)
+            tmp_path = self._instruments_path() + ".tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(updated, f)
+            os.replace(tmp_path, self._instruments_path())
+            self._instruments = updated
+
+    def get_bars(self, exchange, interval, token):
+        """Recorded columns for an instrument, or None if nothing was recorded."""
+        key = (exchange, interval, str(token))
+        with self._lock:
+            if key not in self._bars:
+                path = self._bars_path(exchange, interval, token)
+                if not os.path.exists(path):
+                    return None
+                with np.load(path) as data:
+                    columns = {name: data[name] for name in BAR_COLUMNS}
+                columns['datetime'] = columns['datetime'].astype('datetime64[ns]')
+                self._bars[key] = columns
+            return self._bars[key]
+
+    def put_bars(self, exchange, interval, token, columns):
+        """Merge newly recorded columns into the stored series (newer values win)."""
+        existing = self.get_bars(exchange, interval, token)
+        if existing is not None:
+            merged = {name: np.concatenate([existing[name], columns[name]]) for name in BAR_COLUMNS}
+            # Keep the last occurrence of each timestamp, i.e. the newest recording
+            reversed_stamps = merged['datetime'][::-1]
+            _, first = np.unique(reversed_stamps, return_index=True)
+            keep = len(reversed_stamps) - 1 - first
+            columns = {name: values[keep] for name, values in merged.items()}
+
+        path = self._bars_path(exchange, interval, token)
+        with self._lock:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = path[:-len(".npz")] + ".tmp.npz"
+            np.savez_compressed(
+                tmp_path,
+                **{name: columns[name] for name in BAR_COLUMNS if name != 'datetime'},
+                datetime=columns['datetime'].astype('datetime64[ns]').astype(np.int64)
+            )
+            os.replace(tmp_path, path)
+            self._bars[(exchange, interval, str(token))] = columns
+
+class RecordingAlice:
+    """Pass-through to a live Aliceblue session that saves every response to a cassette store."""
+
+    def __init__(self, alice, store):
+        self.alice = alice
+        self.store = store
+
+    def get_session_id(self, *args, **kwargs):
+        return self.alice.get_session_id(*args, **kwargs)
+
+    def get_instrument_by_token(self, exchange, token):
+        instrument = self.alice.get_instrument_by_token(exchange, token)
+        if hasattr(instrument, 'token'):
+            self.store.put_instrument(exchange, instrument)
+        return instrument
+
+    def get_instrument_by_symbol(self, exchange, symbol):
+        instrument = self.alice.get_instrument_by_symbol(exchange, symbol)
+        if hasattr(instrument, 'token'):
+            self.store.put_instrument(exchange, instrument)
+        return instrument
+
+    def get_historical(self, instrument, from_datetime, to_datetime, interval, indices=False):
+        if indices:
+            response = self.alice.get_historical(instrument, from_datetime, to_datetime, interval, indices=True)
+        else:
+            response = self.alice.get_historical(instrument, from_datetime, to_datetime, interval)
+        try:
+            columns = decode_historical(response)
+        except Exception:
+            # Broker errors are passed through unrecorded
+            return response
+        if len(columns['datetime']):
+            self.store.put_bars(instrument.exchange, interval, instrument.token, columns)
+        return response
+
+class ReplayAlice:
+    """
+    Serves recorded responses with no network access or delay.
+
+    ``as_of`` replays a past day: ``now`` reports the end of that day, so
+    windows the screens compute from it end there; windows computed from the
+    real clock are shifted back to end there too.
+    """
+
+    def __init__(self, store, as_of=None):
+        self.store = store
+        self.as_of = as_of
+
+    def now(self):
+        """The broker's current time: the end of the replayed day, or the real time."""
+        if self.as_of:
+            return datetime.datetime.combine(self.as_of, datetime.time.max)
+        return datetime.datetime.now()
+
+    def get_session_id(self, *args, **kwargs):
+        return {'stat': 'Ok', 'sessionID': 'replay'}
+
+    def get_instrument_by_token(self, exchange, token):
+        instrument = self.store.get_instrument(exchange, token)
+        if instrument is None:
+            raise Exception(f"No recorded instrument for {exchange}:{token}")
+        return instrument
+
+    def get_instrument_by_symbol(self, exchange, symbol):
+        instrument = self.store.find_instrument(exchange, symbol)
+        if instrument is None:
+            raise Exception(f"No recorded instrument for {exchange}:{symbol}")
+        return instrument
+
+    def get_historical(self, instrument, from_datetime, to_datetime, interval, indices=False):
+        columns = self.store.get_bars(instrument.exchange, interval, instrument.token)
+        if columns is None:
+            return {'stat': 'Not_Ok', 'emsg': f"No recorded bars for {instrument.exchange}:{instrument.token}"}
+        if self.as_of:
+            shift = datetime.datetime.combine(self.as_of, datetime.time.max) - to_datetime
+            from_datetime, to_datetime = from_datetime + shift, to_datetime + shift
+        return _slice_window(columns, from_datetime, to_datetime)
+
+def _slice_window(columns, from_datetime, to_datetime):
+    stamps = columns['datetime']
+    start = np.searchsorted(stamps, np.datetime64(from_datetime.replace(tzinfo=None), 'ns'), side='left')
+    stop = np.searchsorted(stamps, np.datetime64(to_datetime.replace(tzinfo=None), 'ns'), side='right')
+    return bars_to_frame({name: values[start:stop] for name, values in columns.items()})
+
+class SyntheticAlice:
+    """
+    Stand-in broker serving deterministic synthetic bars after a configurable
+    delay, for load tests and local runs without credentials or recordings.
+
+    Args:
+        latency: Seconds each get_historical call waits, like a broker round trip
+        jitter: Extra uniformly random delay of up to this many seconds
+        history_days: Length of the generated history every window is cut from
+        seed: Seed of the synthetic universe
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, history_days=730, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.history_days = history_days
+        self.seed = seed
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def get_session_id(self, *args, **kwargs):
+        return {'stat': 'Ok', 'sessionID': 'synthetic'}
+
+    def get_instrument_by_token(self, exchange, token):
+        return synthetic_instrument(token, 'BSE' if exchange.startswith('BSE') else exchange)
+
+    def get_instrument_by_symbol(self, exchange, symbol):
+        raise Exception(f"No synthetic instrument for {exchange}:{symbol}")
+
+    def get_historical(self, instrument, from_datetime, to_datetime, interval, indices=False):
+        delay = self.latency + (random.uniform(0, self.jitter) if self.jitter else 0)
+        if delay:
+            time.sleep(delay)
+        key = (instrument.exchange, instrument.token, interval)
+        with self._lock:
+            columns = self._series.get(key)
+        if columns is None:
+            columns = synthetic_bars(instrument.token, self.history_days, seed=self.seed, interval=interval)
+            with self._lock:
+                self._series[key] = columns
+        return _slice_window(columns, from_datetime, to_datetime)
+
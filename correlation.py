@@ -0,0 +1,110 @@
+import numpy as np
+import pandas as pd
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+
+CORRELATION_WINDOW = 120
+CORRELATION_THRESHOLD = 0.8
+BLOCK_SIZE = 512
+
+def standardized_returns(panel, window=CORRELATION_WINDOW, min_periods=None):
+    """
+    Standardized daily returns over the last ``window`` bars.
+
+    Columns are scaled so that the dot product of two columns is their
+    correlation. Missing returns become 0 after demeaning, which treats them as
+    "no information" rather than dropping the whole date.
+
+    Returns:
+        tuple: (float32 array of shape window x tokens, list of tokens kept)
+    """
+    min_periods = min_periods or window // 2
+    returns = panel.ffill().pct_change(fill_method=None).iloc[-window:]
+    counts = returns.notna().sum()
+    std = returns.std()
+    keep = (counts >= min_periods) & (std > 0)
+    returns = returns.loc[:, keep]
+
+    values = returns.to_numpy(dtype=np.float64)
+    values = (values - np.nanmean(values, axis=0)) / np.nanstd(values, axis=0)
+    values = np.nan_to_num(values, nan=0.0) / np.sqrt(len(values))
+    return values.astype(np.float32), list(returns.columns)
+
+def iter_correlated_pairs(z, threshold=CORRELATION_THRESHOLD, block_size=BLOCK_SIZE):
+    """
+    Yield (rows, cols, correlations) arrays for the column pairs above ``threshold``,
+    one block at a time, with rows < cols.
+
+    The correlation matrix is never materialized: each step multiplies one block
+    of columns against the columns to its right, so peak memory is
+    block_size x tokens floats.
+    """
+    n = z.shape[1]
+    for start in range(0, n, block_size):
+        stop = min(start + block_size, n)
+        block = z[:, start:stop].T @ z[:, start:]
+        rows, cols = np.nonzero(block > threshold)
+        upper = cols > rows
+        rows, cols = rows[upper], cols[upper]
+        yield rows + start, cols + start, block[rows, cols]
+
+def cluster_tokens(panel, threshold=CORRELATION_THRESHOLD, window=CORRELATION_WINDOW, block_size=BLOCK_SIZE):
+    """
+    Group tokens whose recent returns are correlated above ``threshold``.
+
+    Clusters are the connected components of the sparse "correlated" graph
+    (single linkage) collected block by block.
+
+    Returns:
+        dict: token -> cluster id (tokens without enough history get their own cluster)
+    """
+    if panel.empty:
+        return {}
+    z, tokens = standardized_returns(panel, window)
+    edges = list(iter_correlated_pairs(z, threshold, block_size))
+    rows = np.concatenate([e[0] for e in edges]) if edges else np.empty(0, dtype=np.int64)
+    cols = np.concatenate([e[1] for e in edges]) if edges else np.empty(0, dtype=np.int64)
+    graph = coo_matrix((np.ones(len(rows), dtype=np.int8), (rows, cols)), shape=(len(tokens), len(tokens)))
+    _, labels = connected_components(graph, directed=False)
+
+    clusters = {token: int(label) for token, label in zip(tokens, labels)}
+    next_id = len(tokens)
+    for token in panel.columns:
+        if token not in clusters:
+            clusters[token] = next_id
+            next_id += 1
+    return clusters
+
+def diversify_results(token_results, clusters, max_per_cluster=1):
+    """
+    Keep at most ``max_per_cluster`` of the strongest results from each cluster.
+
+    Every kept result gets a Cluster id and Cluster_Hits, the number of
+    screening hits that fell in its cluster.
+
+    Args:
+        token_results: List of (token, result dict)
+        clusters: token -> cluster id from ``cluster_tokens``
+        max_per_cluster: Results kept per cluster
+
+    Returns:
+        list: (token, result) pairs, strongest first
+    """
+    ranked = sorted(token_results, key=lambda item: -item[1]['Strength'])
+    cluster_of = {
+        token: clusters.get(token, f"token-{token}") for token, _ in ranked
+    }
+    hits = pd.Series(list(cluster_of.values())).value_counts().to_dict() if ranked else {}
+
+    kept = []
+    taken = {}
+    for token, result in ranked:
+        cluster = cluster_of[token]
+        if taken.get(cluster, 0) >= max_per_cluster:
+            continue
+        taken[cluster] = taken.get(cluster, 0) + 1
+        result = dict(result)
+        result['Cluster'] = cluster
+        result['Cluster_Hits'] = hits[cluster]
+        kept.append((token, result))
+    return kept
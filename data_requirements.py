@@ -0,0 +1,59 @@
+import math
+from collections import namedtuple
+
+# The one-year daily window every screen used to fetch
+FULL_HISTORY_DAYS = 365
+SESSION_MINUTES = 375
+
+# History a strategy needs:
+#   bars: bars the analysis reads, or None for the full year (EMAs seeded from
+#       the first bar and swing windows sized from the series length change
+#       with where the series starts)
+#   interval: bar interval
+#   prefilter_bars: bars a cheap pre-check needs; only stocks that pass it
+#       fetch ``bars``
+DataRequirement = namedtuple('DataRequirement', ['bars', 'interval', 'prefilter_bars'], defaults=("D", None))
+
+STRATEGY_REQUIREMENTS = {
+    # Volume surge (20-bar mean) and the last two candles decide the score;
+    # survivors get the full year for market structure and volume profile
+    "Price Action Breakout": DataRequirement(None, "D", prefilter_bars=21),
+    "Volume Profile Analysis": DataRequirement(None, "D"),
+    "Market Structure Analysis": DataRequirement(None, "D"),
+    "Multi-Factor Analysis": DataRequirement(None, "D"),
+    "EMA, RSI & Support Zone (Buy)": DataRequirement(None, "D"),
+    "EMA, RSI & Resistance Zone (Sell)": DataRequirement(None, "D")
+}
+
+def custom_requirement(duration_days):
+    """Custom Price Movement: the move itself plus the 20-bar volume trend."""
+    return DataRequirement(max(duration_days, 20), "D")
+
+def days_for_bars(bars, interval="D"):
+    """
+    Calendar days to request so at least ``bars`` bars come back.
+
+    Weekends are added exactly; 5% plus a week covers exchange holidays.
+    """
+    if bars is None:
+        return FULL_HISTORY_DAYS
+    sessions = bars if interval == "D" else math.ceil(bars / (SESSION_MINUTES // int(interval)))
+    return int(math.ceil(sessions * 7 / 5 * 1.05)) + 7
+
+def history_days(requirement, prefilter=False):
+    """Calendar days for a requirement's main fetch, or its pre-check with prefilter=True."""
+    bars = requirement.prefilter_bars if prefilter else requirement.bars
+    return days_for_bars(bars, requirement.interval)
+
+def covering_windows(requirements):
+    """
+    Smallest fetch windows covering several requirements at once.
+
+    Returns:
+        dict: interval -> calendar days
+    """
+    windows = {}
+    for requirement in requirements:
+        days = history_days(requirement)
+        windows[requirement.interval] = max(windows.get(requirement.interval, 0), days)
+    return windows
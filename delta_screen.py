@@ -0,0 +1,233 @@
+import os
+import json
+import datetime
+import numpy as np
+import pandas as pd
+from alice_client import fetch_latest_bars, extend_history, get_history
+from advanced_analysis import iter_token_results
+from bar_decoder import BAR_COLUMNS
+from scan_jobs import to_json_safe
+
+DELTA_STATE_DIR = "delta_state"
+# Calendar days probed for new bars; covers a long weekend
+PROBE_DAYS = 7
+
+def bar_fingerprint(columns):
+    """The latest bar's time and values (a live candle changes as it trades), or None without bars."""
+    if not len(columns['datetime']):
+        return None
+    return [str(columns['datetime'][-1])] + [float(columns[name][-1]) for name in BAR_COLUMNS[1:]]
+
+def diff_results(previous, current):
+    """
+    Compare two result sets keyed by token.
+
+    Returns:
+        dict: new (results now qualifying), dropped (results no longer
+        qualifying) and changed (Name, Previous_Strength, Strength, Change)
+    """
+    changed = []
+    for token, result in current.items():
+        before = previous.get(token)
+        if before is not None and abs(result['Strength'] - before['Strength']) > 1e-9:
+            changed.append({
+                'Name': result['Name'],
+                'Previous_Strength': before['Strength'],
+                'Strength': result['Strength'],
+                'Change': result['Strength'] - before['Strength']
+            })
+    return {
+        'new': [result for token, result in current.items() if token not in previous],
+        'dropped': [result for token, result in previous.items() if token not in current],
+        'changed': sorted(changed, key=lambda row: -abs(row['Change']))
+    }
+
+class DeltaScreen:
+    """
+    A screen that re-analyzes only the tokens whose data moved since its last
+    run, and reports what changed.
+
+    Each run probes every token with a short fetch (a few bars instead of a
+    year) and compares its latest bar with the one last evaluated. The probe
+    bars are spliced into the shared bar cache, so the tokens that changed
+    are re-analyzed without a full refetch; the others keep their previous
+    result. Per-token state and the last result set are kept in
+    ``<directory>/<screen_id>.json`` across runs and restarts.
+
+    Cross-sectional screens (``finalize`` with a ``bars`` dict) also need the
+    closes of tokens that were not re-analyzed. Those are kept in
+    ``<directory>/<screen_id>.npz`` and put into ``bars`` on load, so the
+    finalize step does not refetch a year of bars for the whole universe.
+    """
+
+    def __init__(self, alice, screen_id, tokens, analyze_token, exchange='NSE', finalize=None,
+                 interval="D", probe_days=PROBE_DAYS, max_workers=50, directory=DELTA_STATE_DIR,
+                 bars=None):
+        self.alice = alice
+        self.screen_id = screen_id
+        self.tokens = list(tokens)
+        self.analyze_token = analyze_token
+        self.exchange = exchange
+        self.finalize = finalize
+        self.interval = interval
+        self.probe_days = probe_days
+        self.max_workers = max_workers
+        self.directory = directory
+        self.bars = bars
+        self.evaluated = {}
+        self.previous = {}
+        self.load()
+
+    @classmethod
+    def from_scan_job(cls, alice, job, exchange='NSE', **kwargs):
+        """Delta version of a scan built by a ``scan_jobs`` factory (same analysis and finalize step)."""
+        # Scan job ids are per day; the delta state carries over between days
+        screen_id = job.job_id.replace(f"-{datetime.date.today().isoformat()}", "", 1)
+        return cls(
+            alice, screen_id, job.tokens, job.analyze_token, exchange, job.finalize, bars=job.bars, **kwargs
+        )
+
+    @property
+    def path(self):
+        return os.path.join(self.directory, f"{self.screen_id}.json")
+
+    @property
+    def closes_path(self):
+        return os.path.join(self.directory, f"{self.screen_id}.npz")
+
+    def load(self):
+        """Restore the last run's state. Returns True if one was found."""
+        if not os.path.exists(self.path):
+            return False
+        try:
+            with open(self.path, "r") as f:
+                state = json.load(f)
+        except (json.JSONDecodeError, OSError) as e:
+            print(f"Ignoring unreadable delta state {self.path}: {e}")
+            return False
+
+        by_key = {str(token): token for token in self.tokens}
+        self.evaluated = {
+            by_key[str(entry['token'])]: {'fingerprint': entry['fingerprint'], 'result': entry['result']}
+            for entry in state.get('evaluated', []) if str(entry['token']) in by_key
+        }
+        self.previous = {
+            by_key[str(entry['token'])]: entry['result']
+            for entry in state.get('results', []) if str(entry['token']) in by_key
+        }
+        if self.bars is not None and os.path.exists(self.closes_path):
+            try:
+                with np.load(self.closes_path) as data:
+                    for key, token in by_key.items():
+                        if token not in self.bars and f"{key}__close" in data.files:
+                            self.bars[token] = pd.DataFrame({
+                                'datetime': data[f"{key}__datetime"].astype('datetime64[ns]'),
+                                'close': data[f"{key}__close"]
+                            })
+            except (OSError, ValueError) as e:
+                print(f"Ignoring unreadable delta closes {self.closes_path}: {e}")
+        return True
+
+    def save(self):
+        """Atomically write the state."""
+        os.makedirs(self.directory, exist_ok=True)
+        state = {
+            'screen_id': self.screen_id,
+            'updated': datetime.datetime.now().isoformat(),
+            'evaluated': [{'token': t, **entry} for t, entry in self.evaluated.items()],
+            'results': [{'token': t, 'result': r} for t, r in self.previous.items()]
+        }
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(state, f, default=to_json_safe)
+        if self.bars is not None:
+            arrays = {}
+            for token in self.tokens:
+                if token in self.bars:
+                    df = self.bars[token]
+                    arrays[f"{token}__datetime"] = df['datetime'].to_numpy().astype('datetime64[ns]').astype(np.int64)
+                    arrays[f"{token}__close"] = df['close'].to_numpy(dtype=np.float64)
+            tmp_closes = self.closes_path[:-len(".npz")] + ".tmp.npz"
+            np.savez_compressed(tmp_closes, **arrays)
+            os.replace(tmp_closes, self.closes_path)
+        os.replace(tmp_path, self.path)
+
+    def _probe(self, token):
+        _, columns = fetch_latest_bars(self.alice, token, self.probe_days, self.interval, self.exchange)
+        # Unchanged tokens too: their cached bars are now current for the finalize step
+        extend_history(token, columns, self.interval, self.exchange)
+        return bar_fingerprint(columns)
+
+    def _cached_fingerprint(self, token):
+        _, df = get_history(self.alice, token, self.probe_days, self.interval, self.exchange)
+        return bar_fingerprint({name: df[name].to_numpy() for name in BAR_COLUMNS})
+
+    def changed_tokens(self, tokens):
+        """
+        Probe tokens for new data.
+
+        Returns:
+            tuple: (changed tokens with their new fingerprints, failed token -> reason)
+        """
+        changed = {}
+        failed = {}
+        for token, fingerprint, error in iter_token_results(self._probe, tokens, self.max_workers):
+            if error is not None:
+                failed[token] = f"{type(error).__name__}: {error}"
+            elif token not in self.evaluated or self.evaluated[token]['fingerprint'] != fingerprint:
+                changed[token] = fingerprint
+        return changed, failed
+
+    def run(self):
+        """
+        Re-screen the tokens with new data and diff against the last run.
+
+        Returns:
+            dict: results (the full current result set), new, dropped and
+            changed (see ``diff_results``), reanalyzed (number of tokens
+            analyzed), failed (token -> reason; these keep their previous
+            result) and first_run
+        """
+        first_run = not self.evaluated
+        # Tokens never evaluated are analyzed without a probe; their fingerprint
+        # comes from the bars the analysis just cached
+        unseen = [t for t in self.tokens if t not in self.evaluated]
+        changed, failed = self.changed_tokens([t for t in self.tokens if t in self.evaluated])
+        reanalyze = list(changed) + unseen
+        for token, result, error in iter_token_results(self.analyze_token, reanalyze, self.max_workers):
+            if error is not None:
+                failed[token] = f"{type(error).__name__}: {error}"
+                continue
+            try:
+                fingerprint = changed[token] if token in changed else self._cached_fingerprint(token)
+            except Exception as e:
+                failed[token] = f"{type(e).__name__}: {e}"
+                continue
+            self.evaluated[token] = {'fingerprint': fingerprint, 'result': result}
+
+        token_results = [
+            (t, self.evaluated[t]['result']) for t in self.tokens
+            if t in self.evaluated and self.evaluated[t]['result']
+        ]
+        if self.finalize:
+            token_results = self.finalize(token_results)
+        current = dict(token_results)
+
+        report = diff_results(self.previous, current)
+        report.update({
+            'results': [result for _, result in token_results],
+            'reanalyzed': len(reanalyze),
+            'failed': failed,
+            'first_run': first_run
+        })
+        self.previous = current
+        self.save()
+        return report
+
+    def discard(self):
+        """Delete the state so the next run analyzes every token again."""
+        for path in (self.path, self.closes_path):
+            if os.path.exists(path):
+                os.remove(path)
+        self.evaluated = {}
+        self.previous = {}
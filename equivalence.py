@@ -0,0 +1,219 @@
+import argparse
+import glob
+import os
+import numpy as np
+import pandas as pd
+from advanced_analysis import (
+    identify_candlestick_patterns, analyze_volume_profile, analyze_volume_profile_fast,
+    analyze_market_structure, analyze_price_movement
+)
+from bar_decoder import bars_to_frame, decode_historical
+from factors import build_close_panel
+from stock_analysis import compute_rsi, compute_rsi_panel, analyze_bullish, analyze_bearish
+from synthetic_data import synthetic_universe, synthetic_instrument
+
+DEFAULT_RTOL = 1e-9
+DEFAULT_ATOL = 1e-9
+
+def prepare_indicators(df):
+    """Indicator columns ``stock_analysis.analyze_stock`` adds before its checks."""
+    df = df.copy()
+    df['50_EMA'] = df['close'].ewm(span=50, adjust=False).mean()
+    df['200_EMA'] = df['close'].ewm(span=200, adjust=False).mean()
+    df['RSI'] = compute_rsi(df['close'])
+    return df
+
+# Per-stock reference implementations: (token, df) -> output. Each gets its own
+# copy of the bars because several of them add columns to the frame.
+REFERENCES = {
+    'compute_rsi': lambda token, df: compute_rsi(df['close']),
+    # Synthetic levels must not reach alert engines following real scans
+    'analyze_bullish': lambda token, df: analyze_bullish(
+        prepare_indicators(df), synthetic_instrument(token), publish=False
+    ),
+    'analyze_bearish': lambda token, df: analyze_bearish(
+        prepare_indicators(df), synthetic_instrument(token), publish=False
+    ),
+    'identify_candlestick_patterns': lambda token, df: identify_candlestick_patterns(df.copy()),
+    'analyze_volume_profile': lambda token, df: analyze_volume_profile(df.copy()),
+    'analyze_market_structure': lambda token, df: analyze_market_structure(df.copy()),
+    'analyze_price_movement': lambda token, df: analyze_price_movement(df.copy(), 20, 5.0, 'up')
+}
+
+def _rsi_batch(universe):
+    panel = build_close_panel(universe)
+    rsi = compute_rsi_panel(panel)
+    return {
+        token: pd.Series(
+            rsi[token].reindex(pd.DatetimeIndex(df['datetime']).normalize()).to_numpy(),
+            index=df.index
+        )
+        for token, df in universe.items() if token in rsi.columns
+    }
+
+# Optimized implementations checked against the references. Per-token candidates
+# have the reference signature; batch candidates take the whole universe and
+# return token -> output.
+CANDIDATES = {
+    'analyze_volume_profile': {
+        'candidate': lambda token, df: analyze_volume_profile_fast(df.copy()),
+        'batch': False
+    },
+    'compute_rsi': {
+        'candidate': _rsi_batch,
+        'batch': True
+    }
+}
+
+FIELD_TOLERANCES = {}
+
+def register_candidate(name, candidate, batch=False, tolerances=None):
+    """
+    Register an optimized implementation of a reference function.
+
+    Args:
+        name: Key in ``REFERENCES``
+        candidate: Per-token ``(token, df) -> output`` or, with batch=True,
+            ``(universe) -> {token: output}``
+        batch: Whether the candidate processes the whole universe at once
+        tolerances: Optional field -> (rtol, atol) overrides
+    """
+    if name not in REFERENCES:
+        raise ValueError(f"No reference implementation named {name}")
+    CANDIDATES[name] = {'candidate': candidate, 'batch': batch}
+    if tolerances:
+        FIELD_TOLERANCES[name] = tolerances
+
+def flatten_output(output):
+    """Break an analysis output into comparable fields."""
+    if isinstance(output, Exception):
+        return {'error': type(output).__name__}
+    if output is None:
+        return {'value': None}
+    if isinstance(output, dict):
+        return dict(output)
+    if isinstance(output, pd.DataFrame):
+        fields = {'shape': output.shape}
+        fields.update({column: output[column].to_numpy() for column in output.columns})
+        return fields
+    if isinstance(output, pd.Series):
+        return {'values': output.to_numpy()}
+    if isinstance(output, tuple):
+        return {f"item_{i}": value for i, value in enumerate(output)}
+    return {'value': output}
+
+def values_match(reference, candidate, rtol=DEFAULT_RTOL, atol=DEFAULT_ATOL):
+    """Compare two field values; numbers within tolerance, NaN equal to NaN."""
+    if isinstance(reference, (list, tuple)) and isinstance(candidate, (list, tuple)):
+        if len(reference) != len(candidate):
+            return False
+        return all(values_match(r, c, rtol, atol) for r, c in zip(reference, candidate))
+    ref = np.asarray(reference)
+    cand = np.asarray(candidate)
+    if ref.dtype.kind in 'fiub' and cand.dtype.kind in 'fiub':
+        if ref.shape != cand.shape:
+            return False
+        return bool(np.allclose(ref.astype(float), cand.astype(float), rtol=rtol, atol=atol, equal_nan=True))
+    if ref.shape != cand.shape:
+        return False
+    return bool(np.all(ref == cand))
+
+def _call(fn, *args):
+    try:
+        return fn(*args)
+    except Exception as e:
+        return e
+
+def compare_outputs(name, token, reference, candidate):
+    """Mismatch rows for one token of one case."""
+    ref_fields = flatten_output(reference)
+    cand_fields = flatten_output(candidate)
+    tolerances = FIELD_TOLERANCES.get(name, {})
+    mismatches = []
+    for field in sorted(set(ref_fields) | set(cand_fields), key=str):
+        if field not in ref_fields or field not in cand_fields:
+            detail = 'missing in candidate' if field not in cand_fields else 'missing in reference'
+            mismatches.append((name, token, field, ref_fields.get(field), cand_fields.get(field), detail))
+            continue
+        rtol, atol = tolerances.get(field, (DEFAULT_RTOL, DEFAULT_ATOL))
+        if not values_match(ref_fields[field], cand_fields[field], rtol, atol):
+            mismatches.append((name, token, field, ref_fields[field], cand_fields[field], 'value differs'))
+    return mismatches
+
+def run_equivalence(universe, names=None):
+    """
+    Run every reference and its candidate over a universe and compare them.
+
+    Args:
+        universe: token -> OHLCV DataFrame
+        names: Optional subset of case names (default: every case with a candidate)
+
+    Returns:
+        tuple: (mismatches DataFrame with case/token/field/reference/candidate/detail,
+                summary DataFrame with one row per case)
+    """
+    names = names or list(CANDIDATES)
+    rows = []
+    summary = []
+    for name in names:
+        reference = REFERENCES[name]
+        spec = CANDIDATES[name]
+        if spec['batch']:
+            batch = _call(spec['candidate'], universe)
+            candidate_outputs = batch if isinstance(batch, dict) else {token: batch for token in universe}
+        else:
+            candidate_outputs = {token: _call(spec['candidate'], token, df) for token, df in universe.items()}
+
+        case_rows = []
+        for token, df in universe.items():
+            ref_output = _call(reference, token, df)
+            cand_output = candidate_outputs.get(token, KeyError(f"no output for {token}"))
+            case_rows.extend(compare_outputs(name, token, ref_output, cand_output))
+        rows.extend(case_rows)
+        summary.append({
+            'case': name,
+            'tokens': len(universe),
+            'mismatched_tokens': len({row[1] for row in case_rows}),
+            'mismatched_fields': len(case_rows)
+        })
+
+    mismatches = pd.DataFrame(rows, columns=['case', 'token', 'field', 'reference', 'candidate', 'detail'])
+    return mismatches, pd.DataFrame(summary)
+
+def load_recorded_universe(directory):
+    """
+    Load recorded bars: one ``<token>.csv`` or ``<token>.parquet`` per token with
+    datetime/open/high/low/close/volume columns.
+    """
+    universe = {}
+    for path in sorted(glob.glob(os.path.join(directory, "*.csv")) + glob.glob(os.path.join(directory, "*.parquet"))):
+        stem = os.path.splitext(os.path.basename(path))[0]
+        token = int(stem) if stem.isdigit() else stem
+        data = pd.read_parquet(path) if path.endswith(".parquet") else pd.read_csv(path)
+        universe[token] = bars_to_frame(decode_historical(data))
+    return universe
+
+def main():
+    parser = argparse.ArgumentParser(description="Check optimized analysis paths against the reference implementations.")
+    parser.add_argument("--tokens", type=int, default=500, help="Synthetic universe size")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--recorded", help="Directory of recorded bars to check as well")
+    parser.add_argument("--case", action="append", help="Only run these cases")
+    args = parser.parse_args()
+
+    universes = {'synthetic': synthetic_universe(range(1, args.tokens + 1), seed=args.seed)}
+    if args.recorded:
+        universes['recorded'] = load_recorded_universe(args.recorded)
+
+    failed = False
+    for label, universe in universes.items():
+        mismatches, summary = run_equivalence(universe, args.case)
+        print(f"\n{label} universe ({len(universe)} tokens)")
+        print(summary.to_string(index=False))
+        if not mismatches.empty:
+            failed = True
+            print(mismatches.head(50).to_string(index=False))
+    raise SystemExit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
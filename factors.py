@@ -0,0 +1,201 @@
+import os
+import numpy as np
+import pandas as pd
+from alice_client import fetch_historical_bars
+from stock_lists import STOCK_LISTS
+
+SECTOR_MAP_FILE = "sector_map.csv"
+INSTRUMENT_MASTERS = {'NSE': 'NSE.csv', 'BSE': 'BSE (1).csv'}
+SECTOR_COLUMNS = ['Sector', 'Industry']
+UNCLASSIFIED = 'Unclassified'
+
+def load_sector_map(exchange='NSE', path=SECTOR_MAP_FILE):
+    """
+    Load a token -> sector mapping.
+
+    ``path`` is a CSV with a ``Sector`` or ``Industry`` column and either
+    ``Token`` or ``Symbol`` (optionally ``Exch`` to hold both exchanges in
+    one file). NSE's index constituent downloads (e.g. ind_nifty500list.csv)
+    fit as they are; symbols are resolved to tokens through the exchange's
+    instrument master. When the file does not exist, a Sector/Industry column
+    in the instrument master is used instead.
+
+    Returns:
+        dict: token -> sector name (empty if no source is available)
+    """
+    master_path = INSTRUMENT_MASTERS.get(exchange, '')
+    source = None
+    if os.path.exists(path):
+        source = pd.read_csv(path)
+        if 'Exch' in source.columns:
+            source = source[source['Exch'] == exchange]
+    elif os.path.exists(master_path):
+        source = pd.read_csv(master_path)
+
+    if source is None:
+        return {}
+    column = next((c for c in SECTOR_COLUMNS if c in source.columns), None)
+    if column is None:
+        return {}
+    if 'Token' not in source.columns:
+        if 'Symbol' not in source.columns or not os.path.exists(master_path):
+            return {}
+        master = pd.read_csv(master_path, usecols=['Symbol', 'Token'])
+        source = source.merge(master.drop_duplicates('Symbol'), on='Symbol')
+    source = source.dropna(subset=['Token', column])
+    return dict(zip(source['Token'].astype(int), source[column].astype(str)))
+
+def build_close_panel(frames):
+    """
+    Align many tokens' closes into one dates x tokens panel.
+
+    Args:
+        frames: Mapping of token -> DataFrame with datetime and close columns
+
+    Returns:
+        DataFrame: Closes indexed by date, one column per token (NaN where missing)
+    """
+    frames = {token: df for token, df in frames.items() if len(df)}
+    if not frames:
+        return pd.DataFrame()
+    lengths = np.array([len(df) for df in frames.values()])
+    timestamps = pd.to_datetime(
+        np.concatenate([np.asarray(df['datetime']) for df in frames.values()])
+    ).normalize().to_numpy()
+    closes = np.concatenate([np.asarray(df['close'], dtype=np.float64) for df in frames.values()])
+
+    dates, rows = np.unique(timestamps, return_inverse=True)
+    cols = np.repeat(np.arange(len(frames)), lengths)
+    values = np.full((len(dates), len(frames)), np.nan)
+    values[rows, cols] = closes
+    return pd.DataFrame(values, index=pd.DatetimeIndex(dates), columns=list(frames))
+
+def benchmark_proxy(panel, exchange='NSE'):
+    """
+    Equal-weighted NIFTY 50 proxy from the panel, used when no index series is
+    supplied. Falls back to the whole universe when no constituent is present.
+    """
+    members = [t for t in STOCK_LISTS.get('NIFTY 50', []) if t in panel.columns]
+    basket = panel[members] if exchange == 'NSE' and members else panel
+    returns = basket.pct_change(fill_method=None).mean(axis=1).fillna(0)
+    return (1 + returns).cumprod()
+
+def _trailing_return(panel, lookback):
+    filled = panel.ffill()
+    if len(filled) <= lookback:
+        return pd.Series(np.nan, index=panel.columns)
+    return filled.iloc[-1] / filled.iloc[-1 - lookback] - 1
+
+def compute_cross_sectional_factors(panel, benchmark=None, sectors=None, lookback=63,
+                                    short_lookback=21, ema_span=50, exchange='NSE'):
+    """
+    Compute relative strength, breadth and sector factors for a whole universe at once.
+
+    Args:
+        panel: Close panel from ``build_close_panel``
+        benchmark: Optional NIFTY close series indexed by date
+        sectors: Optional token -> sector mapping
+        lookback: Bars used for relative strength
+        short_lookback: Bars used for the short leg of sector rotation
+        ema_span: EMA span used for the %-above-EMA breadth
+
+    Returns:
+        tuple: (per-token DataFrame, market breadth dict, per-sector DataFrame)
+    """
+    if panel.empty:
+        return pd.DataFrame(), {}, pd.DataFrame()
+
+    if benchmark is None:
+        benchmark = benchmark_proxy(panel, exchange)
+    benchmark = benchmark.reindex(panel.index).ffill()
+
+    rs_return = _trailing_return(panel, lookback)
+    short_return = _trailing_return(panel, short_lookback)
+    bench_return = _trailing_return(benchmark.to_frame('benchmark'), lookback)['benchmark']
+
+    last_close = panel.ffill().iloc[-1]
+    ema = panel.ewm(span=ema_span, adjust=False).mean().iloc[-1]
+    day_change = panel.ffill().pct_change(fill_method=None).iloc[-1]
+
+    factors = pd.DataFrame({
+        'RS_Return': rs_return * 100,
+        'RS_Rank': rs_return.rank(pct=True) * 100,
+        'RS_vs_NIFTY': ((1 + rs_return) / (1 + bench_return) - 1) * 100,
+        'Short_Rank': short_return.rank(pct=True) * 100,
+        'Above_EMA': last_close > ema,
+        'Day_Change': day_change * 100
+    })
+    factors['Sector'] = [
+        (sectors or {}).get(token, UNCLASSIFIED) for token in factors.index
+    ]
+
+    breadth = {
+        'Advances': int((day_change > 0).sum()),
+        'Declines': int((day_change < 0).sum()),
+        'Unchanged': int((day_change == 0).sum()),
+        'Pct_Above_EMA': float(factors['Above_EMA'].mean() * 100)
+    }
+    breadth['AD_Ratio'] = breadth['Advances'] / breadth['Declines'] if breadth['Declines'] else float('inf')
+
+    by_sector = factors.groupby('Sector')
+    sector_stats = pd.DataFrame({
+        'Members': by_sector.size(),
+        'Sector_RS': by_sector['RS_Rank'].median(),
+        'Sector_Short_RS': by_sector['Short_Rank'].median(),
+        'Sector_Breadth': by_sector['Above_EMA'].mean() * 100,
+        'Sector_Advances': by_sector['Day_Change'].apply(lambda x: int((x > 0).sum()))
+    })
+    sector_stats['Sector_Rank'] = sector_stats['Sector_RS'].rank(ascending=False, method='min')
+    # Positive momentum: the sector ranks better over the short window than the long one
+    sector_stats['Sector_Momentum'] = sector_stats['Sector_Short_RS'] - sector_stats['Sector_RS']
+
+    factors = factors.join(
+        sector_stats[['Sector_RS', 'Sector_Rank', 'Sector_Breadth', 'Sector_Momentum']], on='Sector'
+    )
+    return factors, breadth, sector_stats
+
+def apply_cross_sectional_factors(token_results, factors, breadth=None):
+    """
+    Join the cross-sectional factors onto per-token results and add them to the score.
+
+    Args:
+        token_results: List of (token, result dict)
+        factors: Per-token DataFrame from ``compute_cross_sectional_factors``
+        breadth: Optional market breadth dict, reported as Market_Breadth
+
+    Returns:
+        list: (token, result) pairs with RS columns (and sector columns when
+        at least two sectors are classified) and updated Strength
+    """
+    if factors.empty:
+        return token_results
+    columns = ['RS_Rank', 'RS_vs_NIFTY']
+    # Sector rotation needs sectors to compare; without a sector map every
+    # stock shares one group and the bonus would go to all or none
+    use_sectors = factors.loc[factors['Sector'] != UNCLASSIFIED, 'Sector'].nunique() >= 2
+    if use_sectors:
+        columns += ['Sector', 'Sector_Rank', 'Sector_Breadth', 'Sector_Momentum']
+    present = factors.reindex([token for token, _ in token_results])[columns]
+    bonus = (present['RS_Rank'].fillna(0) / 20).round()
+    if use_sectors:
+        bonus += np.where(present['Sector_Momentum'] > 0, 2, 0)
+
+    joined = []
+    for (token, result), values, extra in zip(token_results, present.to_dict('records'), bonus):
+        result = dict(result)
+        result.update(values)
+        if breadth:
+            result['Market_Breadth'] = breadth['Pct_Above_EMA']
+        result['Strength'] = result['Strength'] + int(extra)
+        joined.append((token, result))
+    return joined
+
+def fetch_benchmark(alice, from_date, to_date, symbol='NIFTY 50'):
+    """Fetch the index close series from the broker, or None if it is unavailable."""
+    try:
+        instrument = alice.get_instrument_by_symbol('INDICES', symbol)
+        bars = fetch_historical_bars(alice, instrument, from_date, to_date, "D", indices=True)
+        return pd.Series(bars['close'], index=pd.DatetimeIndex(bars['datetime']).normalize())
+    except Exception as e:
+        print(f"Error fetching {symbol} benchmark: {e}")
+        return None
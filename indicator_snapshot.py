@@ -0,0 +1,264 @@
+import argparse
+import datetime
+import json
+import os
+import shutil
+import numpy as np
+import pandas as pd
+from alice_client import get_history, initialize_alice, BROKER_BACKEND
+from advanced_analysis import iter_token_results
+from broker_backend import SyntheticAlice
+from data_requirements import FULL_HISTORY_DAYS
+from screen_filters import FeatureContext
+
+SNAPSHOT_DIR = "snapshots"
+
+# Indexed columns: numbers get a sorted index for range scans, labels and
+# flags a bitmap per distinct value.
+NUMERIC_COLUMNS = [
+    'close', 'ema50', 'ema200', 'ema_spread_pct', 'rsi', 'volume_ratio',
+    'support_distance_pct', 'resistance_distance_pct', 'bars'
+]
+LABEL_COLUMNS = ['market_structure']
+FLAG_COLUMNS = ['ema50_above_ema200', 'doji', 'hammer', 'bullish_engulfing']
+PATTERN_FLAGS = {'doji': 'Doji', 'hammer': 'Hammer', 'bullish_engulfing': 'Bullish Engulfing'}
+
+def snapshot_row(token, instrument, df):
+    """One token's indicator values on its latest bar, computed as the filter expressions compute them."""
+    ctx = FeatureContext(df)
+    ema50 = ctx.value('ema', (50,))
+    ema200 = ctx.value('ema', (200,))
+    patterns = ctx.value('patterns')
+    row = {
+        'token': token,
+        'name': instrument.symbol,
+        'bar_date': pd.Timestamp(df['datetime'].iloc[-1]).date().isoformat(),
+        'close': ctx.value('close'),
+        'ema50': ema50,
+        'ema200': ema200,
+        'ema_spread_pct': (ema50 - ema200) / ema200 * 100,
+        'rsi': ctx.value('rsi'),
+        'volume_ratio': ctx.value('volume_ratio', (20,)),
+        'support_distance_pct': ctx.value('support_distance'),
+        'resistance_distance_pct': ctx.value('resistance_distance'),
+        'bars': len(df),
+        'market_structure': ctx.value('market_structure'),
+        'ema50_above_ema200': bool(ema50 > ema200)
+    }
+    for column, pattern in PATTERN_FLAGS.items():
+        row[column] = pattern in patterns
+    return row
+
+def build_snapshot(alice, tokens, exchange='NSE'):
+    """
+    Indicator rows for every token, from the shared bar cache (fetching what is missing).
+
+    Returns:
+        pd.DataFrame: One row per token that has bars
+    """
+    def analyze(token):
+        instrument, df = get_history(alice, token, FULL_HISTORY_DAYS, "D", exchange)
+        return snapshot_row(token, instrument, df) if len(df) else None
+
+    rows = []
+    for token, row, error in iter_token_results(analyze, tokens):
+        if error is not None:
+            print(f"Snapshot failed for {token}: {error}")
+        elif row:
+            rows.append(row)
+    table = pd.DataFrame(rows)
+    if table.empty:
+        return table
+    return table.sort_values('token', key=lambda tokens: tokens.astype(str)).reset_index(drop=True)
+
+def snapshot_path(exchange, date, directory=SNAPSHOT_DIR):
+    return os.path.join(directory, exchange, date.isoformat())
+
+def save_snapshot(table, exchange, date=None, directory=SNAPSHOT_DIR):
+    """
+    Write a snapshot table and its indexes::
+
+        <directory>/<exchange>/<date>/table.parquet  the rows
+        <directory>/<exchange>/<date>/index.npz      sorted values and row ids per numeric
+                                                     column, packed bitmaps per label/flag value
+        <directory>/<exchange>/<date>/meta.json      row count and label values
+
+    The files are written to a temporary directory that then replaces the
+    day's snapshot, so readers never see a mix of two builds.
+    """
+    date = date or datetime.date.today()
+    path = snapshot_path(exchange, date, directory)
+    tmp_path = path + ".tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+
+    table = table.copy()
+    table['token'] = table['token'].astype(str)
+    table.to_parquet(os.path.join(tmp_path, "table.parquet"), index=False)
+
+    arrays = {}
+    for column in NUMERIC_COLUMNS:
+        values = table[column].to_numpy(dtype=np.float64)
+        rows = np.flatnonzero(~np.isnan(values))
+        order = rows[np.argsort(values[rows], kind='stable')]
+        arrays[f"{column}__values"] = values[order]
+        arrays[f"{column}__rows"] = order.astype(np.int32)
+    labels = {}
+    for column in LABEL_COLUMNS:
+        labels[column] = sorted(table[column].dropna().unique().tolist())
+        for i, value in enumerate(labels[column]):
+            arrays[f"{column}__{i}"] = np.packbits((table[column] == value).to_numpy())
+    for column in FLAG_COLUMNS:
+        arrays[f"{column}__1"] = np.packbits(table[column].to_numpy(dtype=bool))
+    np.savez(os.path.join(tmp_path, "index.npz"), **arrays)
+
+    with open(os.path.join(tmp_path, "meta.json"), "w") as f:
+        json.dump({'rows': len(table), 'labels': labels, 'created': datetime.datetime.now().isoformat()}, f)
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp_path, path)
+    return path
+
+def latest_snapshot_date(exchange, directory=SNAPSHOT_DIR):
+    """Most recent complete snapshot date for an exchange, or None."""
+    root = os.path.join(directory, exchange)
+    if not os.path.isdir(root):
+        return None
+    dates = [
+        name for name in os.listdir(root)
+        if not name.endswith(".tmp") and os.path.exists(os.path.join(root, name, "meta.json"))
+    ]
+    return datetime.date.fromisoformat(max(dates)) if dates else None
+
+class IndicatorSnapshot:
+    """
+    Read side of a day's snapshot. Queries are answered from the indexes;
+    the table is only read to return the matching rows.
+
+    Example::
+
+        snapshot = IndicatorSnapshot.load('NSE')
+        snapshot.where(rsi=(30, 70), ema_spread_pct=(0, None), support_distance_pct=(5, 20))
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "meta.json"), "r") as f:
+            meta = json.load(f)
+        self.rows = meta['rows']
+        self.labels = meta['labels']
+        with np.load(os.path.join(path, "index.npz")) as data:
+            self._index = {name: data[name] for name in data.files}
+        self._table = None
+
+    @classmethod
+    def load(cls, exchange='NSE', date=None, directory=SNAPSHOT_DIR):
+        """The snapshot of ``date`` (default: the latest one)."""
+        date = date or latest_snapshot_date(exchange, directory)
+        if date is None:
+            raise FileNotFoundError(f"No {exchange} indicator snapshot in {directory}")
+        return cls(snapshot_path(exchange, date, directory))
+
+    @property
+    def table(self):
+        if self._table is None:
+            self._table = pd.read_parquet(os.path.join(self.path, "table.parquet"))
+        return self._table
+
+    def range_mask(self, column, low=None, high=None):
+        """Rows with low <= column <= high (either bound may be None); NaN never matches."""
+        values = self._index[f"{column}__values"]
+        start = 0 if low is None else np.searchsorted(values, low, side='left')
+        stop = len(values) if high is None else np.searchsorted(values, high, side='right')
+        mask = np.zeros(self.rows, dtype=bool)
+        mask[self._index[f"{column}__rows"][start:stop]] = True
+        return mask
+
+    def value_mask(self, column, value):
+        """Rows where a label or flag column equals ``value`` (a list matches any of them)."""
+        if isinstance(value, (list, tuple, set)):
+            mask = np.zeros(self.rows, dtype=bool)
+            for item in value:
+                mask |= self.value_mask(column, item)
+            return mask
+        if column in FLAG_COLUMNS:
+            mask = np.unpackbits(self._index[f"{column}__1"], count=self.rows).astype(bool)
+            return mask if value else ~mask
+        if column not in self.labels:
+            raise ValueError(f"{column} is not an indexed column")
+        if value not in self.labels[column]:
+            return np.zeros(self.rows, dtype=bool)
+        i = self.labels[column].index(value)
+        return np.unpackbits(self._index[f"{column}__{i}"], count=self.rows).astype(bool)
+
+    def mask(self, **conditions):
+        """
+        Rows matching every condition: ``column=(low, high)`` for numeric
+        columns, ``column=value`` or ``column=[values]`` for labels and flags.
+        """
+        mask = np.ones(self.rows, dtype=bool)
+        for column, condition in conditions.items():
+            if column in NUMERIC_COLUMNS:
+                low, high = condition
+                mask &= self.range_mask(column, low, high)
+            else:
+                mask &= self.value_mask(column, condition)
+        return mask
+
+    def where(self, **conditions):
+        """Matching rows as a DataFrame (see ``mask``)."""
+        return self.table.iloc[np.flatnonzero(self.mask(**conditions))].reset_index(drop=True)
+
+def snapshot_universes(alice, universes, date=None, directory=SNAPSHOT_DIR):
+    """
+    Build and save one snapshot per exchange covering every stock list in
+    ``universes`` (list name -> (exchange, tokens)).
+
+    Returns:
+        dict: exchange -> snapshot directory
+    """
+    by_exchange = {}
+    for exchange, tokens in universes.values():
+        by_exchange.setdefault(exchange, set()).update(tokens)
+    paths = {}
+    for exchange, tokens in by_exchange.items():
+        table = build_snapshot(alice, sorted(tokens, key=str), exchange)
+        if not table.empty:
+            paths[exchange] = save_snapshot(table, exchange, date, directory)
+    return paths
+
+def _parse_condition(text):
+    column, _, value = text.partition("=")
+    if column in NUMERIC_COLUMNS:
+        low, _, high = value.partition(":")
+        return column, (float(low) if low else None, float(high) if high else None)
+    if column in FLAG_COLUMNS:
+        return column, value.lower() in ("1", "true", "yes")
+    return column, value.split(",") if "," in value else value
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or query the daily indicator snapshot.")
+    parser.add_argument("--dir", default=SNAPSHOT_DIR)
+    parser.add_argument("--exchange", default="NSE")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build_parser = commands.add_parser("build", help="Build today's snapshots for every stock list")
+    build_parser.add_argument("--backend", default=BROKER_BACKEND, choices=["live", "record", "replay", "synthetic"])
+    query_parser = commands.add_parser("query", help="Query the latest snapshot")
+    query_parser.add_argument("--date", type=datetime.date.fromisoformat)
+    query_parser.add_argument(
+        "--where", action="append", default=[],
+        help="column=low:high for numbers, column=value[,value] for labels, column=true|false for flags"
+    )
+    args = parser.parse_args()
+
+    if args.command == "build":
+        from warmup import default_universes
+        alice = SyntheticAlice() if args.backend == "synthetic" else initialize_alice(args.backend)
+        for exchange, path in snapshot_universes(alice, default_universes(), directory=args.dir).items():
+            print(f"{exchange}: {path}")
+    else:
+        snapshot = IndicatorSnapshot.load(args.exchange, args.date, args.dir)
+        matches = snapshot.where(**dict(_parse_condition(text) for text in args.where))
+        print(matches.to_string(index=False))
+
+if __name__ == "__main__":
+    main()
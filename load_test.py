@@ -0,0 +1,227 @@
+import argparse
+import os
+import threading
+import time
+import numpy as np
+import pandas as pd
+from advanced_analysis import analyze_all_tokens_advanced
+from alice_client import invalidate_history
+from broker_backend import SyntheticAlice
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+SESSION_LEVELS = (1, 2, 5, 10)
+SAMPLE_SECONDS = 0.05
+
+# A level is flagged when the median session takes this many times longer than
+# a lone session did...
+CONTENTION_SLOWDOWN = 1.5
+# ...when the process keeps this share of its CPUs busy...
+CPU_SATURATION = 0.9
+# ...or when it runs more threads than this per CPU.
+THREADS_PER_CPU = 32
+
+def current_rss_mb():
+    """Resident memory of this process in MB (peak RSS where the current value is unavailable)."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports KB, macOS bytes
+        return peak / (1024 * 1024) if peak > 1 << 32 else peak / 1024
+    return float('nan')
+
+def cpu_seconds():
+    times = os.times()
+    return times.user + times.system
+
+class ResourceSampler:
+    """Background sampler of thread count and memory while a load level runs."""
+
+    def __init__(self, interval=SAMPLE_SECONDS):
+        self.interval = interval
+        self.peak_threads = 0
+        self.peak_rss_mb = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        self.peak_threads = max(self.peak_threads, threading.active_count())
+        self.peak_rss_mb = max(self.peak_rss_mb, current_rss_mb())
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def __enter__(self):
+        self._sample()
+        self._thread = threading.Thread(target=self._run, name="load-test-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+        return False
+
+def session_tokens(tokens, sessions, disjoint=False):
+    """Token list of each session: the same list for all, or equal disjoint slices."""
+    if not disjoint:
+        return [list(tokens)] * sessions
+    return [list(chunk) for chunk in np.array_split(np.asarray(tokens), sessions)]
+
+def run_level(sessions, tokens, strategy, latency=0.05, jitter=0.0, exchange='NSE',
+              disjoint=False, cold_cache=True, seed=0):
+    """
+    Run ``sessions`` simultaneous screens, each with its own stand-in broker
+    session, the way concurrent users of one app instance do.
+
+    All sessions are released together from a barrier. They share the
+    process-wide bar cache, as in the app; with cold_cache=True it is emptied
+    first so every level pays the broker latency.
+
+    Returns:
+        dict: Latency, throughput, thread, CPU and memory figures for the level
+    """
+    if cold_cache:
+        invalidate_history()
+    lists = session_tokens(tokens, sessions, disjoint)
+    barrier = threading.Barrier(sessions + 1)
+    latencies = [None] * sessions
+    errors = []
+
+    def session(i):
+        alice = SyntheticAlice(latency=latency, jitter=jitter, seed=seed)
+        barrier.wait()
+        start = time.perf_counter()
+        try:
+            analyze_all_tokens_advanced(alice, lists[i], strategy, exchange)
+        except Exception as e:
+            errors.append(e)
+        latencies[i] = time.perf_counter() - start
+
+    threads = [threading.Thread(target=session, args=(i,), name=f"load-test-session-{i}") for i in range(sessions)]
+    for thread in threads:
+        thread.start()
+
+    rss_before = current_rss_mb()
+    with ResourceSampler() as sampler:
+        cpu_before = cpu_seconds()
+        barrier.wait()
+        start = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        wall = time.perf_counter() - start
+        cpu_used = cpu_seconds() - cpu_before
+
+    screened = sum(len(token_list) for token_list in lists)
+    return {
+        'sessions': sessions,
+        'tokens_per_session': round(screened / sessions),
+        'wall_s': wall,
+        'latency_p50_s': float(np.median(latencies)),
+        'latency_p95_s': float(np.percentile(latencies, 95)),
+        'latency_max_s': float(np.max(latencies)),
+        'throughput_tokens_s': screened / wall if wall else float('nan'),
+        'peak_threads': sampler.peak_threads,
+        'cpu_s': cpu_used,
+        'cpus_busy': cpu_used / wall if wall else float('nan'),
+        'peak_rss_mb': sampler.peak_rss_mb,
+        'rss_growth_mb': sampler.peak_rss_mb - rss_before,
+        'errors': len(errors)
+    }
+
+def flag_level(row, baseline_p50, cpu_count=None):
+    """
+    Name the scaling problems a level shows.
+
+    - oversubscribed: more threads alive than THREADS_PER_CPU per CPU
+    - cpu_saturated: the CPUs are busy, so more sessions only queue
+    - contention: sessions slow down although the CPUs are not busy, i.e.
+      they wait on the GIL, locks or a full thread pool
+    - errors: some session raised
+    """
+    cpu_count = cpu_count or os.cpu_count() or 1
+    flags = []
+    if row['peak_threads'] > THREADS_PER_CPU * cpu_count:
+        flags.append('oversubscribed')
+    saturated = row['cpus_busy'] >= CPU_SATURATION * cpu_count
+    if saturated:
+        flags.append('cpu_saturated')
+    slowdown = row['latency_p50_s'] / baseline_p50 if baseline_p50 else float('nan')
+    if slowdown > CONTENTION_SLOWDOWN and not saturated:
+        flags.append('contention')
+    if row['errors']:
+        flags.append('errors')
+    return slowdown, flags
+
+def run_load_test(levels=SESSION_LEVELS, tokens=200, strategy="Price Action Breakout", latency=0.05,
+                  jitter=0.0, exchange='NSE', disjoint=False, cold_cache=True, seed=0, on_level=None):
+    """
+    Measure how screening scales as the number of concurrent sessions grows.
+
+    Args:
+        levels: Session counts to run, in order (the first is the baseline)
+        tokens: Synthetic tokens screened per session (or split across sessions with disjoint=True)
+        strategy: Advanced strategy every session runs
+        latency: Seconds per broker request of the stand-in broker
+        jitter: Extra random latency of up to this many seconds
+        on_level: Optional callback(row) after each level
+
+    Returns:
+        pd.DataFrame: One row per level with the figures of ``run_level`` plus slowdown and flags
+    """
+    token_ids = list(range(1, tokens + 1))
+    rows = []
+    baseline = None
+    for sessions in levels:
+        row = run_level(sessions, token_ids, strategy, latency, jitter, exchange, disjoint, cold_cache, seed)
+        # Compare seconds per token so disjoint slices of different sizes stay comparable
+        if baseline is None:
+            baseline = row['latency_p50_s'] / row['tokens_per_session']
+        row['slowdown'], flags = flag_level(row, baseline * row['tokens_per_session'])
+        row['flags'] = ",".join(flags)
+        rows.append(row)
+        if on_level:
+            on_level(row)
+    return pd.DataFrame(rows)
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test concurrent screening sessions against a stand-in broker.")
+    parser.add_argument("--sessions", default=",".join(map(str, SESSION_LEVELS)),
+                        help="Comma-separated session counts, e.g. 1,2,5,10")
+    parser.add_argument("--tokens", type=int, default=200, help="Tokens screened per session")
+    parser.add_argument("--strategy", default="Price Action Breakout")
+    parser.add_argument("--latency", type=float, default=0.05, help="Broker round trip in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Extra random latency in seconds")
+    parser.add_argument("--disjoint", action="store_true", help="Split the tokens across sessions instead of repeating them")
+    parser.add_argument("--warm-cache", action="store_true", help="Keep the bar cache between levels")
+    parser.add_argument("--csv", help="Also write the results to this CSV file")
+    args = parser.parse_args()
+
+    levels = [int(level) for level in args.sessions.split(",") if level.strip()]
+    print(f"{os.cpu_count()} CPUs, {args.tokens} tokens, {args.latency * 1000:.0f} ms broker latency")
+    results = run_load_test(
+        levels, args.tokens, args.strategy, args.latency, args.jitter,
+        disjoint=args.disjoint, cold_cache=not args.warm_cache,
+        on_level=lambda row: print(
+            f"{row['sessions']:>3} sessions: p50 {row['latency_p50_s']:.2f}s, "
+            f"{row['peak_threads']} threads, {row['cpus_busy']:.2f} CPUs, {row['peak_rss_mb']:.0f} MB"
+        )
+    )
+    print(results.round(3).to_string(index=False))
+    if args.csv:
+        results.to_csv(args.csv, index=False)
+    raise SystemExit(1 if results['flags'].str.contains('contention|errors').any() else 0)
+
+if __name__ == "__main__":
+    main()
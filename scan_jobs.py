@@ -0,0 +1,232 @@
+import os
+import json
+import hashlib
+import datetime
+from advanced_analysis import (
+    iter_token_results, analyze_stock_advanced, analyze_stock_custom,
+    needs_universe_bars, finalize_advanced_results
+)
+from stock_analysis import analyze_stock
+from screen_filters import analyze_stock_filtered, parse_filter
+
+SCAN_JOBS_DIR = "scan_jobs"
+# Checkpoints older than this are deleted by ``prune_checkpoints``
+CHECKPOINT_MAX_AGE_DAYS = 2
+
+def to_json_safe(obj):
+    """JSON ``default`` hook for NumPy scalars and arrays found in analysis results."""
+    if hasattr(obj, 'tolist'):
+        return obj.tolist()
+    if hasattr(obj, 'item'):
+        return obj.item()
+    if isinstance(obj, (datetime.date, datetime.datetime)):
+        return obj.isoformat()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+def make_job_id(kind, tokens, exchange='NSE', **params):
+    """Build a stable job id so the same scan on the same day resumes the same checkpoint."""
+    fingerprint = json.dumps(
+        {'tokens': list(tokens), 'params': params}, sort_keys=True, default=str
+    )
+    digest = hashlib.sha1(fingerprint.encode()).hexdigest()[:12]
+    return f"{kind}-{exchange}-{datetime.date.today().isoformat()}-{digest}"
+
+class ScanJob:
+    """
+    A checkpointed scan of a token universe.
+
+    Completed tokens (with their result, or None when the stock did not qualify) and
+    failed tokens (with the error message) are written to ``<directory>/<job_id>.json``
+    every ``checkpoint_every`` tokens, so a rerun with the same job id only analyzes
+    what is still outstanding. ``finalize`` optionally post-processes the full list
+    of (token, result) pairs once the run ends, e.g. a cross-sectional stage;
+    ``bars`` is then the token -> DataFrame dict the analysis collects for it.
+    """
+
+    def __init__(self, job_id, tokens, analyze_token, checkpoint_every=50, max_workers=50,
+                 directory=SCAN_JOBS_DIR, finalize=None, bars=None):
+        self.job_id = job_id
+        self.tokens = list(tokens)
+        self.analyze_token = analyze_token
+        self.checkpoint_every = checkpoint_every
+        self.max_workers = max_workers
+        self.directory = directory
+        self.finalize = finalize
+        self.bars = bars
+        self.completed = {}
+        self.failed = {}
+        self.load()
+
+    @property
+    def path(self):
+        return os.path.join(self.directory, f"{self.job_id}.json")
+
+    def load(self):
+        """Restore progress from the checkpoint file. Returns True if one was found."""
+        if not os.path.exists(self.path):
+            return False
+        try:
+            with open(self.path, "r") as f:
+                state = json.load(f)
+        except (json.JSONDecodeError, OSError) as e:
+            print(f"Ignoring unreadable checkpoint {self.path}: {e}")
+            return False
+
+        by_key = {str(token): token for token in self.tokens}
+        self.completed = {
+            by_key[str(entry['token'])]: entry['result']
+            for entry in state.get('completed', []) if str(entry['token']) in by_key
+        }
+        self.failed = {
+            by_key[str(entry['token'])]: entry['reason']
+            for entry in state.get('failed', []) if str(entry['token']) in by_key
+        }
+        return True
+
+    def save(self):
+        """Atomically write the current progress to the checkpoint file."""
+        os.makedirs(self.directory, exist_ok=True)
+        state = {
+            'job_id': self.job_id,
+            'updated': datetime.datetime.now().isoformat(),
+            'total': len(self.tokens),
+            'completed': [{'token': t, 'result': r} for t, r in self.completed.items()],
+            'failed': [{'token': t, 'reason': r} for t, r in self.failed.items()]
+        }
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(state, f, default=to_json_safe)
+        os.replace(tmp_path, self.path)
+
+    def pending_tokens(self, retry_failed=False):
+        """Tokens not yet completed; failed tokens are included only when retrying."""
+        return [
+            t for t in self.tokens
+            if t not in self.completed and (retry_failed or t not in self.failed)
+        ]
+
+    @property
+    def is_finished(self):
+        return not self.pending_tokens()
+
+    @property
+    def results(self):
+        """Qualifying results in universe order."""
+        return [self.completed[t] for t in self.tokens if self.completed.get(t)]
+
+    def run(self, retry_failed=False, on_progress=None):
+        """
+        Analyze every outstanding token and return all qualifying results.
+
+        Args:
+            retry_failed: Also re-run tokens that failed on a previous run
+            on_progress: Optional callback ``(done, total)`` called after each token
+
+        Returns:
+            list: Qualifying results, including those restored from the checkpoint
+        """
+        pending = self.pending_tokens(retry_failed)
+        since_checkpoint = 0
+        try:
+            for token, result, error in iter_token_results(self.analyze_token, pending, self.max_workers):
+                if error is not None:
+                    self.failed[token] = f"{type(error).__name__}: {error}"
+                else:
+                    self.failed.pop(token, None)
+                    self.completed[token] = result
+                since_checkpoint += 1
+                if since_checkpoint >= self.checkpoint_every:
+                    self.save()
+                    since_checkpoint = 0
+                if on_progress:
+                    on_progress(len(self.completed) + len(self.failed), len(self.tokens))
+        finally:
+            self.save()
+        if self.finalize:
+            token_results = [(t, self.completed[t]) for t in self.tokens if self.completed.get(t)]
+            return [result for _, result in self.finalize(token_results)]
+        return self.results
+
+    def retry_failed(self, on_progress=None):
+        """Re-run only the tokens that failed."""
+        return self.run(retry_failed=True, on_progress=on_progress)
+
+    def discard(self):
+        """Delete the checkpoint so the next run starts from scratch."""
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self.completed = {}
+        self.failed = {}
+
+def prune_checkpoints(directory=SCAN_JOBS_DIR, max_age_days=CHECKPOINT_MAX_AGE_DAYS):
+    """Delete checkpoint files not written to in ``max_age_days``. Returns how many were removed."""
+    if not os.path.isdir(directory):
+        return 0
+    cutoff = datetime.datetime.now().timestamp() - max_age_days * 86400
+    removed = 0
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        try:
+            if name.endswith((".json", ".tmp")) and os.path.getmtime(path) < cutoff:
+                os.remove(path)
+                removed += 1
+        except OSError as e:
+            print(f"Could not remove old checkpoint {path}: {e}")
+    return removed
+
+def advanced_scan_job(alice, tokens, strategy, exchange='NSE', max_per_cluster=None, **kwargs):
+    """Checkpointed equivalent of ``analyze_all_tokens_advanced``."""
+    # Checkpoints hold results from before the finalize step, but keying on the
+    # diversification keeps a delta screen's stored result set per variant
+    params = {'strategy': strategy}
+    if max_per_cluster:
+        params['max_per_cluster'] = max_per_cluster
+    job_id = make_job_id("advanced", tokens, exchange, **params)
+    finalize = None
+    bars = None
+    if needs_universe_bars(strategy, max_per_cluster):
+        # Bars of tokens restored from a checkpoint are fetched again by finalize
+        bars = {}
+        finalize = lambda token_results: finalize_advanced_results(
+            alice, tokens, token_results, bars, strategy, exchange, max_per_cluster
+        )
+    return ScanJob(
+        job_id, tokens,
+        lambda token: analyze_stock_advanced(alice, token, strategy, exchange, raise_errors=True, bars=bars),
+        finalize=finalize,
+        bars=bars,
+        **kwargs
+    )
+
+def custom_scan_job(alice, tokens, duration_days, target_percentage, direction='up', exchange='NSE', **kwargs):
+    """Checkpointed equivalent of ``analyze_all_tokens_custom``."""
+    job_id = make_job_id(
+        "custom", tokens, exchange,
+        duration_days=duration_days, target_percentage=target_percentage, direction=direction
+    )
+    return ScanJob(
+        job_id, tokens,
+        lambda token: analyze_stock_custom(
+            alice, token, duration_days, target_percentage, direction, exchange, raise_errors=True
+        ),
+        **kwargs
+    )
+
+def filtered_scan_job(alice, tokens, expression, exchange='NSE', **kwargs):
+    """Checkpointed equivalent of ``screen_filters.analyze_all_tokens_filtered``."""
+    job_id = make_job_id("filtered", tokens, exchange, expression=expression)
+    condition = parse_filter(expression)
+    return ScanJob(
+        job_id, tokens,
+        lambda token: analyze_stock_filtered(alice, token, condition, exchange, raise_errors=True),
+        **kwargs
+    )
+
+def basic_scan_job(alice, tokens, strategy, exchange='NSE', **kwargs):
+    """Checkpointed equivalent of ``stock_analysis.analyze_all_tokens``."""
+    job_id = make_job_id("basic", tokens, exchange, strategy=strategy)
+    return ScanJob(
+        job_id, tokens,
+        lambda token: analyze_stock(alice, token, strategy, exchange, raise_errors=True),
+        **kwargs
+    )
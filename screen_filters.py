@@ -0,0 +1,372 @@
+import ast
+import inspect
+import operator
+import numpy as np
+from scipy.signal import argrelextrema
+from alice_client import get_history
+from data_requirements import DataRequirement, history_days
+from advanced_analysis import (
+    CANDLESTICK_PATTERNS, identify_candlestick_patterns, analyze_market_structure, iter_token_results
+)
+from stock_analysis import compute_rsi
+from timeframes import get_timeframe
+
+MIN_BARS = 100
+# Largest window/span an indicator argument may ask for: about a year of sessions
+MAX_WINDOW = 250
+
+# Feature name -> (function(ctx, *args), relative cost). Costs only need to be
+# right relative to each other: last-bar arithmetic is cheapest, full-series
+# indicators next, swing-point and resampling analyses the most expensive.
+FEATURES = {}
+# Feature name -> bars it reads, as a function of its arguments; features that
+# need the full history (see ``data_requirements``) are not listed.
+FEATURE_BARS = {}
+
+def feature(name, cost, bars=None):
+    def register(fn):
+        FEATURES[name] = (fn, cost)
+        if bars is not None:
+            FEATURE_BARS[name] = bars
+        return fn
+    return register
+
+@feature('close', 1, bars=lambda: 1)
+def _close(ctx):
+    return float(ctx.df['close'].iloc[-1])
+
+@feature('volume', 1, bars=lambda: 1)
+def _volume(ctx):
+    return float(ctx.df['volume'].iloc[-1])
+
+@feature('pct_change', 1, bars=lambda days=1: days + 1)
+def _pct_change(ctx, days=1):
+    close = ctx.df['close']
+    if len(close) <= days:
+        return np.nan
+    return float((close.iloc[-1] - close.iloc[-1 - days]) / close.iloc[-1 - days] * 100)
+
+@feature('volume_ratio', 1, bars=lambda window=20: window)
+def _volume_ratio(ctx, window=20):
+    """Last volume over its ``window``-bar average (the last bar included)."""
+    volume = ctx.df['volume']
+    if len(volume) < window:
+        return np.nan
+    average = volume.iloc[-window:].mean()
+    return float(volume.iloc[-1] / average) if average > 0 else np.nan
+
+@feature('ema', 2)
+def _ema(ctx, span=50):
+    return float(ctx.ema_series(span).iloc[-1])
+
+@feature('ema_cross', 3)
+def _ema_cross(ctx, fast=50, slow=200, within=5):
+    """True when the fast EMA crossed above the slow EMA in the last ``within`` bars."""
+    above = (ctx.ema_series(fast) > ctx.ema_series(slow)).to_numpy()
+    recent = above[-(within + 1):]
+    return bool(recent[-1] and not recent.all())
+
+@feature('rsi', 3, bars=lambda period=14: period + 1)
+def _rsi(ctx, period=14):
+    return float(compute_rsi(ctx.df['close'], period).iloc[-1])
+
+@feature('support_distance', 6)
+def _support_distance(ctx):
+    """Percent above the nearest recent swing low below the price (NaN if none)."""
+    levels = ctx.swing_levels(np.less_equal)
+    current = ctx.df['close'].iloc[-1]
+    below = levels[levels < current]
+    return float((current - below.max()) / below.max() * 100) if len(below) else np.nan
+
+@feature('resistance_distance', 6)
+def _resistance_distance(ctx):
+    """Percent below the nearest recent swing high above the price (NaN if none)."""
+    levels = ctx.swing_levels(np.greater_equal)
+    current = ctx.df['close'].iloc[-1]
+    above = levels[levels > current]
+    return float((above.min() - current) / above.min() * 100) if len(above) else np.nan
+
+@feature('patterns', 5, bars=lambda: 2)
+def _patterns(ctx):
+    return identify_candlestick_patterns(ctx.df)
+
+@feature('pattern', 5, bars=lambda name: 2)
+def _pattern(ctx, name):
+    return name in ctx.value('patterns', ())
+
+@feature('weekly_patterns', 10)
+def _weekly_patterns(ctx):
+    # The resampled bars may be shared through the cache; the pattern check adds columns
+    return identify_candlestick_patterns(get_timeframe(ctx.key, ctx.df, 'W').copy())
+
+@feature('weekly_pattern', 10)
+def _weekly_pattern(ctx, name):
+    return name in ctx.value('weekly_patterns', ())
+
+@feature('market_structure', 8)
+def _market_structure(ctx):
+    return analyze_market_structure(ctx.df)
+
+@feature('weekly_structure', 12)
+def _weekly_structure(ctx):
+    return analyze_market_structure(get_timeframe(ctx.key, ctx.df, 'W'))
+
+class FeatureContext:
+    """Per-stock feature values, computed on first use and memoized."""
+
+    def __init__(self, df, key=None):
+        self.df = df
+        self.key = key
+        self.values = {}
+        self._series = {}
+
+    def value(self, name, args=()):
+        cache_key = (name, tuple(args))
+        if cache_key not in self.values:
+            fn, _ = FEATURES[name]
+            self.values[cache_key] = fn(self, *args)
+        return self.values[cache_key]
+
+    def pending_cost(self, name, args=()):
+        """Cost of a feature, or 0 when it is already computed."""
+        return 0 if (name, tuple(args)) in self.values else FEATURES[name][1]
+
+    def ema_series(self, span):
+        if ('ema', span) not in self._series:
+            self._series[('ema', span)] = self.df['close'].ewm(span=span, adjust=False).mean()
+        return self._series[('ema', span)]
+
+    def swing_levels(self, comparator, recent=126):
+        """Closes at local extrema within the last ``recent`` bars (as in the support/resistance screens)."""
+        key = ('swing', comparator.__name__)
+        if key not in self._series:
+            close = self.df['close'].to_numpy()
+            order = max(int(len(close) * 0.05), 5)
+            extrema = argrelextrema(close, comparator, order=order)[0]
+            self._series[key] = close[extrema[extrema >= len(close) - recent]]
+        return self._series[key]
+
+class Feature:
+    def __init__(self, name, args=()):
+        self.name = name
+        self.args = tuple(args)
+
+    def label(self):
+        if not self.args:
+            return self.name
+        return f"{self.name}({', '.join(repr(arg) for arg in self.args)})"
+
+    def cost(self, ctx):
+        return ctx.pending_cost(self.name, self.args)
+
+    def evaluate(self, ctx):
+        return ctx.value(self.name, self.args)
+
+class Constant:
+    def __init__(self, value):
+        self.value = value
+
+    def cost(self, ctx):
+        return 0
+
+    def evaluate(self, ctx):
+        return self.value
+
+COMPARATORS = {
+    ast.Lt: operator.lt, ast.LtE: operator.le, ast.Gt: operator.gt,
+    ast.GtE: operator.ge, ast.Eq: operator.eq, ast.NotEq: operator.ne
+}
+
+class Condition:
+    """A leaf: ``left <op> right``, or a boolean feature on its own when op is None."""
+
+    def __init__(self, left, op=None, right=None):
+        self.left = left
+        self.op = op
+        self.right = right
+
+    def cost(self, ctx):
+        return self.left.cost(ctx) + (self.right.cost(ctx) if self.right else 0)
+
+    def evaluate(self, ctx, hits):
+        left = self.left.evaluate(ctx)
+        if self.op is None:
+            passed = bool(left)
+        else:
+            right = self.right.evaluate(ctx)
+            try:
+                passed = bool(self.op(left, right))
+            except TypeError:
+                passed = False
+        hits.append(passed)
+        return passed
+
+class AllOf:
+    def __init__(self, children):
+        self.children = children
+
+    def cost(self, ctx):
+        return sum(child.cost(ctx) for child in self.children)
+
+    def evaluate(self, ctx, hits):
+        # Re-ranked on every call: features computed by earlier siblings cost nothing
+        for child in sorted(self.children, key=lambda child: child.cost(ctx)):
+            if not child.evaluate(ctx, hits):
+                return False
+        return True
+
+class AnyOf(AllOf):
+    def evaluate(self, ctx, hits):
+        for child in sorted(self.children, key=lambda child: child.cost(ctx)):
+            if child.evaluate(ctx, hits):
+                return True
+        return False
+
+class Not:
+    def __init__(self, child):
+        self.child = child
+
+    def cost(self, ctx):
+        return self.child.cost(ctx)
+
+    def evaluate(self, ctx, hits):
+        # Hits inside a negation do not count towards the strength
+        return not self.child.evaluate(ctx, [])
+
+def _parse_operand(node):
+    if isinstance(node, ast.Constant):
+        return Constant(node.value)
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub) and isinstance(node.operand, ast.Constant):
+        value = node.operand.value
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise ValueError(f"Only numbers can be negated (column {node.col_offset + 1})")
+        return Constant(-value)
+    if isinstance(node, ast.Name):
+        name, args = node.id, ()
+    elif isinstance(node, ast.Call) and isinstance(node.func, ast.Name):
+        if node.keywords or not all(isinstance(arg, ast.Constant) for arg in node.args):
+            raise ValueError(f"Arguments of {node.func.id}() must be plain values")
+        name, args = node.func.id, tuple(arg.value for arg in node.args)
+    else:
+        raise ValueError(f"Unsupported expression at column {node.col_offset + 1}")
+    if name not in FEATURES:
+        raise ValueError(f"Unknown indicator: {name}. Available: {', '.join(sorted(FEATURES))}")
+    _check_args(name, args)
+    return Feature(name, args)
+
+def _check_args(name, args):
+    """Reject arguments that would fail, or match nothing, on every stock."""
+    try:
+        inspect.signature(FEATURES[name][0]).bind(None, *args)
+    except TypeError:
+        raise ValueError(f"Wrong number of arguments for {name}()")
+    for arg in args:
+        if name in ('pattern', 'weekly_pattern'):
+            if arg not in CANDLESTICK_PATTERNS:
+                raise ValueError(f"Unknown pattern: {arg!r}. Available: {', '.join(CANDLESTICK_PATTERNS)}")
+        elif isinstance(arg, bool) or not isinstance(arg, int) or not 1 <= arg <= MAX_WINDOW:
+            raise ValueError(f"Arguments of {name}() must be whole numbers from 1 to {MAX_WINDOW}")
+
+def _parse_node(node):
+    if isinstance(node, ast.BoolOp):
+        children = [_parse_node(value) for value in node.values]
+        return AllOf(children) if isinstance(node.op, ast.And) else AnyOf(children)
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+        return Not(_parse_node(node.operand))
+    if isinstance(node, ast.Compare):
+        operands = [_parse_operand(node.left)] + [_parse_operand(c) for c in node.comparators]
+        conditions = []
+        for op, left, right in zip(node.ops, operands, operands[1:]):
+            if type(op) not in COMPARATORS:
+                raise ValueError(f"Unsupported comparison at column {node.col_offset + 1}")
+            conditions.append(Condition(left, COMPARATORS[type(op)], right))
+        # 30 < rsi < 70 is two conditions sharing rsi
+        return conditions[0] if len(conditions) == 1 else AllOf(conditions)
+    return Condition(_parse_operand(node))
+
+def parse_filter(expression):
+    """
+    Parse a filter expression such as
+    ``rsi < 35 and volume_ratio(20) > 1.5 and (pattern('Hammer') or support_distance < 3)``.
+
+    Conditions compare indicators (see ``FEATURES``) with values or with each
+    other, combined with and/or/not and parentheses. Nothing is executed: the
+    expression is only read as a syntax tree.
+    """
+    try:
+        tree = ast.parse(expression.strip(), mode='eval')
+    except SyntaxError as e:
+        raise ValueError(f"Invalid filter expression: {e.msg}")
+    return _parse_node(tree.body)
+
+def _leaf_features(node):
+    if isinstance(node, Condition):
+        return [operand for operand in (node.left, node.right) if isinstance(operand, Feature)]
+    if isinstance(node, Not):
+        return _leaf_features(node.child)
+    return [f for child in node.children for f in _leaf_features(child)]
+
+def filter_requirement(condition):
+    """History a parsed filter needs: the most any of its indicators reads, at least MIN_BARS."""
+    bars = MIN_BARS
+    for leaf in _leaf_features(condition):
+        if leaf.name not in FEATURE_BARS:
+            return DataRequirement(None, "D")
+        bars = max(bars, FEATURE_BARS[leaf.name](*leaf.args))
+    return DataRequirement(bars, "D")
+
+def analyze_stock_filtered(alice, token, expression, exchange='NSE', raise_errors=False):
+    """
+    Screen one stock with a filter expression (a string or a parsed filter).
+
+    Cheaper conditions run first and evaluation stops as soon as the outcome
+    is known, so expensive indicators are only computed for survivors.
+
+    Returns:
+        dict: Name, Close, Volume, the indicators the evaluation computed and
+        Strength (conditions met), or None if the filter fails or no
+        condition was met
+    """
+    try:
+        condition = parse_filter(expression) if isinstance(expression, str) else expression
+        requirement = filter_requirement(condition)
+        instrument, df = get_history(alice, token, history_days(requirement), requirement.interval, exchange)
+        if len(df) < MIN_BARS:
+            return None
+
+        ctx = FeatureContext(df, key=(exchange, token))
+        hits = []
+        # A filter passed only through negations has met no condition
+        if not condition.evaluate(ctx, hits) or not any(hits):
+            return None
+
+        result = {
+            'Name': instrument.symbol,
+            'Close': df['close'].iloc[-1],
+            'Volume': df['volume'].iloc[-1]
+        }
+        # Only what the evaluation needed; short-circuited indicators stay uncomputed
+        for leaf in _leaf_features(condition):
+            if leaf.cost(ctx) == 0:
+                result[leaf.label()] = leaf.evaluate(ctx)
+        result['Strength'] = sum(hits)
+        return result
+
+    except Exception as e:
+        if raise_errors:
+            raise
+        print(f"Error analyzing {token}: {e}")
+        return None
+
+def analyze_all_tokens_filtered(alice, tokens, expression, exchange='NSE'):
+    """Screen all tokens with a filter expression in parallel."""
+    condition = parse_filter(expression)
+    results = []
+    for token, result, error in iter_token_results(
+        lambda t: analyze_stock_filtered(alice, t, condition, exchange), tokens
+    ):
+        if error is not None:
+            print(f"Error processing {token}: {error}")
+        elif result:
+            results.append(result)
+    return results
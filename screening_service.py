@@ -0,0 +1,293 @@
+import argparse
+import io
+import json
+import math
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from alice_client import initialize_alice, BROKER_BACKEND
+from advanced_analysis import (
+    iter_token_results, analyze_stock_advanced, analyze_stock_custom,
+    needs_universe_bars, finalize_advanced_results
+)
+from broker_backend import SyntheticAlice
+from scan_jobs import to_json_safe
+from screen_filters import analyze_stock_filtered, parse_filter
+from stock_analysis import analyze_stock
+from stock_lists import STOCK_LISTS
+from warmup import ADVANCED_STRATEGIES, BASIC_STRATEGIES, default_universes
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8502
+ARROW_STREAM_TYPE = "application/vnd.apache.arrow.stream"
+NDJSON_TYPE = "application/x-ndjson"
+EXCHANGES = ('NSE', 'BSE')
+
+STRATEGIES = (
+    ADVANCED_STRATEGIES + BASIC_STRATEGIES + ["Custom Price Movement", "Custom Filter"]
+)
+
+def json_ready(value):
+    """Plain JSON values for an analysis result (NumPy types converted, NaN/inf as null)."""
+    if isinstance(value, dict):
+        return {str(k): json_ready(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [json_ready(v) for v in value]
+    if isinstance(value, (str, bool, int)) or value is None:
+        return value
+    if isinstance(value, float):
+        return value if math.isfinite(value) else None
+    return json_ready(to_json_safe(value))
+
+def results_to_arrow(results):
+    """Results as a pyarrow Table; columns of mixed types fall back to strings."""
+    import pyarrow as pa
+    rows = [json_ready(result) for result in results]
+    columns = []
+    for row in rows:
+        columns.extend(name for name in row if name not in columns)
+    arrays = {}
+    for name in columns:
+        values = [row.get(name) for row in rows]
+        try:
+            arrays[name] = pa.array(values)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            arrays[name] = pa.array([None if v is None else str(v) for v in values])
+    return pa.table(arrays)
+
+def resolve_universe(request):
+    """(tokens, exchange) from a request naming a stock list or giving tokens."""
+    exchange = request.get('exchange')
+    if exchange is not None and exchange not in EXCHANGES:
+        raise ValueError(f"Unknown exchange: {exchange}")
+    if request.get('tokens'):
+        tokens = request['tokens']
+        if not isinstance(tokens, list) or not all(isinstance(t, (int, str)) for t in tokens):
+            raise ValueError("tokens must be a list of tokens")
+        return tokens, exchange or 'NSE'
+    name = request.get('list')
+    if name not in STOCK_LISTS:
+        raise ValueError(f"Unknown stock list: {name}")
+    list_exchange, tokens = default_universes()[name]
+    return tokens, exchange or list_exchange
+
+def build_screen(alice, request):
+    """
+    Per-token analysis and optional finalize step for a screening request.
+
+    Request fields: strategy, list or tokens, exchange, max_per_cluster,
+    params (duration_days/target_percentage/direction for Custom Price
+    Movement) and expression (for Custom Filter).
+
+    Returns:
+        tuple: (tokens, analyze_token, finalize or None)
+    """
+    strategy = request.get('strategy')
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown strategy: {strategy}")
+    tokens, exchange = resolve_universe(request)
+    params = request.get('params') or {}
+    if not isinstance(params, dict):
+        raise ValueError("params must be an object")
+
+    if strategy in ADVANCED_STRATEGIES:
+        max_per_cluster = request.get('max_per_cluster')
+        if max_per_cluster is not None and (not isinstance(max_per_cluster, int) or max_per_cluster < 1):
+            raise ValueError("max_per_cluster must be a positive integer")
+        bars = {} if needs_universe_bars(strategy, max_per_cluster) else None
+        analyze_token = lambda token: analyze_stock_advanced(
+            alice, token, strategy, exchange, raise_errors=True, bars=bars
+        )
+        finalize = None
+        if bars is not None:
+            finalize = lambda token_results: finalize_advanced_results(
+                alice, tokens, token_results, bars, strategy, exchange, max_per_cluster
+            )
+        return tokens, analyze_token, finalize
+
+    if strategy in BASIC_STRATEGIES:
+        return tokens, lambda token: analyze_stock(alice, token, strategy, exchange, raise_errors=True), None
+
+    if strategy == "Custom Filter":
+        expression = request.get('expression') or ''
+        if not isinstance(expression, str):
+            raise ValueError("expression must be a string")
+        condition = parse_filter(expression)
+        return tokens, lambda token: analyze_stock_filtered(alice, token, condition, exchange, raise_errors=True), None
+
+    duration_days = int(params.get('duration_days', 30))
+    target_percentage = float(params.get('target_percentage', 10.0))
+    direction = params.get('direction', 'up')
+    # Same bounds as the app's inputs
+    if not 1 <= duration_days <= 365:
+        raise ValueError("duration_days must be between 1 and 365")
+    if not 0.1 <= target_percentage <= 1000:
+        raise ValueError("target_percentage must be between 0.1 and 1000")
+    if direction not in ('up', 'down'):
+        raise ValueError(f"Unknown direction: {direction}")
+    return tokens, lambda token: analyze_stock_custom(
+        alice, token, duration_days, target_percentage, direction, exchange, raise_errors=True
+    ), None
+
+def iter_screen(alice, request):
+    """
+    Run a screening request, yielding events as they happen:
+    ``{'event': 'result', 'token', 'result'}``, ``{'event': 'error', 'token', 'error'}``
+    and a final ``{'event': 'done', 'results', 'errors', 'elapsed_s'}``.
+
+    Per-stock strategies yield each result as soon as its token finishes.
+    Cross-sectional ones (ranking, diversification) can only score a stock
+    against the finished universe, so their results follow the last token.
+    """
+    tokens, analyze_token, finalize = build_screen(alice, request)
+    start = time.perf_counter()
+    token_results = []
+    errors = 0
+    for token, result, error in iter_token_results(analyze_token, tokens):
+        if error is not None:
+            errors += 1
+            yield {'event': 'error', 'token': token, 'error': str(error)}
+        elif result:
+            token_results.append((token, result))
+            if finalize is None:
+                yield {'event': 'result', 'token': token, 'result': result}
+    if finalize is not None:
+        token_results = finalize(token_results)
+        for token, result in token_results:
+            yield {'event': 'result', 'token': token, 'result': result}
+    yield {
+        'event': 'done',
+        'results': len(token_results),
+        'errors': errors,
+        'elapsed_s': round(time.perf_counter() - start, 3)
+    }
+
+class ScreeningHandler(BaseHTTPRequestHandler):
+    """
+    Endpoints:
+
+        GET  /health       backend in use
+        GET  /strategies   strategy names
+        GET  /lists        stock list names with exchange and size
+        POST /screen       JSON request (see ``build_screen``); NDJSON events by
+                           default, an Arrow IPC stream of the results with
+                           ?format=arrow or ``Accept: application/vnd.apache.arrow.stream``
+
+    Every request shares the server's broker session and the process-wide bar
+    cache in ``alice_client``, so later screens reuse bars earlier ones fetched.
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    def _send_json(self, status, payload):
+        body = json.dumps(json_ready(payload)).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _write_chunk(self, data):
+        self.wfile.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path == "/health":
+            self._send_json(200, {'status': 'ok', 'backend': self.server.backend})
+        elif path == "/strategies":
+            self._send_json(200, {'strategies': STRATEGIES})
+        elif path == "/lists":
+            self._send_json(200, {
+                'lists': [
+                    {'name': name, 'exchange': exchange, 'tokens': len(tokens)}
+                    for name, (exchange, tokens) in default_universes().items()
+                ]
+            })
+        else:
+            self._send_json(404, {'error': f"Not found: {path}"})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != "/screen":
+            self._send_json(404, {'error': f"Not found: {url.path}"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            request = json.loads(self.rfile.read(length) or b"{}")
+            if not isinstance(request, dict):
+                raise ValueError("Request body must be a JSON object")
+            fmt = parse_qs(url.query).get('format', [request.get('format')])[0]
+            if fmt is None and ARROW_STREAM_TYPE in (self.headers.get("Accept") or ""):
+                fmt = 'arrow'
+            # Validate before any response is started, so bad requests get a 400
+            build_screen(self.server.alice, request)
+        except (ValueError, TypeError, KeyError) as e:
+            self._send_json(400, {'error': str(e)})
+            return
+
+        if fmt == 'arrow':
+            self._send_arrow(request)
+        else:
+            self._send_ndjson(request)
+
+    def _send_ndjson(self, request):
+        self.send_response(200)
+        self.send_header("Content-Type", NDJSON_TYPE)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        events = iter_screen(self.server.alice, request)
+        try:
+            for event in events:
+                self._write_chunk((json.dumps(json_ready(event)) + "\n").encode())
+            self._write_chunk(b"")
+        except (BrokenPipeError, ConnectionResetError):
+            print("Client disconnected during a screen")
+        finally:
+            events.close()
+
+    def _send_arrow(self, request):
+        import pyarrow as pa
+        results = [event['result'] for event in iter_screen(self.server.alice, request) if event['event'] == 'result']
+        table = results_to_arrow(results)
+        sink = io.BytesIO()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        body = sink.getvalue()
+        self.send_response(200)
+        self.send_header("Content-Type", ARROW_STREAM_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+def make_server(alice, host=DEFAULT_HOST, port=DEFAULT_PORT, backend=None):
+    """A threaded screening server bound to ``host:port`` (port 0 picks a free one)."""
+    server = ThreadingHTTPServer((host, port), ScreeningHandler)
+    server.daemon_threads = True
+    server.alice = alice
+    server.backend = backend or type(alice).__name__
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve screening results over HTTP.")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--backend", default=BROKER_BACKEND, choices=["live", "record", "replay", "synthetic"])
+    parser.add_argument("--latency", type=float, default=0.0, help="Synthetic broker latency in seconds")
+    args = parser.parse_args()
+
+    if args.backend == "synthetic":
+        alice = SyntheticAlice(latency=args.latency)
+    else:
+        alice = initialize_alice(args.backend)
+    server = make_server(alice, args.host, args.port, args.backend)
+    print(f"Screening service on http://{args.host}:{server.server_address[1]} ({args.backend} broker)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,11 @@
 import pandas as pd
-from datetime import datetime, timedelta
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import numpy as np
 from sklearn.preprocessing import MinMaxScaler
 from scipy.signal import argrelextrema
-from alice_client import get_cached_historical_data
+from alice_client import get_history
+from data_requirements import DataRequirement, STRATEGY_REQUIREMENTS, history_days
+from alerts import publish_levels
 
 def analyze_stock_batch(alice, tokens, strategy, exchange='NSE', batch_size=50):
     """Analyze a batch of stocks in parallel."""
@@ -24,17 +25,12 @@ def analyze_stock_batch(alice, tokens, strategy, exchange='NSE', batch_size=50):
                 print(f"Error processing {token}: {e}")
     return results
 
-def analyze_stock(alice, token, strategy, exchange='NSE'):
+def analyze_stock(alice, token, strategy, exchange='NSE', raise_errors=False):
     """Analyze a single stock with optimized data fetching."""
     try:
         # Use cached historical data
-        instrument, df = get_cached_historical_data(
-            alice, token, 
-            datetime.now() - timedelta(days=365), 
-            datetime.now(), 
-            "D", 
-            exchange
-        )
+        requirement = STRATEGY_REQUIREMENTS.get(strategy, DataRequirement(None))
+        instrument, df = get_history(alice, token, history_days(requirement), requirement.interval, exchange)
         
         if len(df) < 100:
             return None
@@ -52,6 +48,8 @@ def analyze_stock(alice, token, strategy, exchange='NSE'):
         return None
 
     except Exception as e:
+        if raise_errors:
+            raise
         print(f"Error analyzing {token}: {e}")
         return None
 
@@ -63,8 +61,27 @@ def compute_rsi(prices, period=14):
     rs = gain / loss
     return 100 - (100 / (1 + rs))
 
-def analyze_bullish(df, instrument):
-    """Analyze bullish signals efficiently."""
+def compute_rsi_panel(closes, period=14):
+    """
+    Batched ``compute_rsi`` for a dates x tokens close panel.
+
+    Columns are computed in one rolling pass; each column's first ``period - 1``
+    rows are masked so tokens that start later match the per-stock values.
+    Columns with missing sessions in the middle (suspensions) are recomputed on
+    their own closes, since a gap would otherwise enter the rolling window.
+    """
+    rsi = compute_rsi(closes, period)
+    valid = closes.notna()
+    started = valid.cumsum()
+    rsi = rsi.where(valid & (started >= period))
+
+    interior_gap = (~valid & (started > 0) & (valid[::-1].cumsum()[::-1] > 0)).any()
+    for token in closes.columns[interior_gap.to_numpy()]:
+        rsi[token] = compute_rsi(closes[token].dropna(), period).reindex(closes.index)
+    return rsi
+
+def analyze_bullish(df, instrument, publish=True):
+    """Analyze bullish signals efficiently. ``publish`` announces the support levels found (see ``alerts``)."""
     try:
         # Find support zones
         close_prices = df['close'].values
@@ -84,6 +101,8 @@ def analyze_bullish(df, instrument):
                         'touches': 1
                     })
 
+        if publish:
+            publish_levels(instrument.exchange, instrument.token, 'support', [s['price'] for s in valid_supports])
         if not valid_supports:
             return None
 
@@ -113,8 +132,8 @@ def analyze_bullish(df, instrument):
         print(f"Error in bullish analysis: {e}")
         return None
 
-def analyze_bearish(df, instrument):
-    """Analyze bearish signals efficiently."""
+def analyze_bearish(df, instrument, publish=True):
+    """Analyze bearish signals efficiently. ``publish`` announces the resistance levels found (see ``alerts``)."""
     try:
         # Find resistance zones
         close_prices = df['close'].values
@@ -134,6 +153,10 @@ def analyze_bearish(df, instrument):
                         'touches': 1
                     })
 
+        if publish:
+            publish_levels(
+                instrument.exchange, instrument.token, 'resistance', [r['price'] for r in valid_resistances]
+            )
         if not valid_resistances:
             return None
 
@@ -0,0 +1,87 @@
+from collections import namedtuple
+import numpy as np
+import pandas as pd
+from bar_decoder import BAR_COLUMNS, bars_to_frame
+
+# Same fields as pya3's Instrument, for offline backends and harnesses
+Instrument = namedtuple('Instrument', ['exchange', 'token', 'symbol', 'name', 'expiry', 'lot_size'])
+
+def synthetic_instrument(token, exchange='NSE'):
+    symbol = f"SYN{token}"
+    return Instrument(exchange, token, symbol, symbol, None, 1)
+
+def synthetic_bars(token, days=365, end=None, seed=0, interval="D"):
+    """
+    Deterministic random-walk OHLCV bars for one token.
+
+    The same (seed, token) always yields the same series. Daily bars fall on
+    weekdays ending at ``end``; minute bars cover 09:15-15:29 sessions.
+
+    Returns:
+        dict: Columns in the ``bar_decoder`` layout
+    """
+    rng = np.random.default_rng([seed, token])
+    end = pd.Timestamp(end or pd.Timestamp.today()).normalize()
+    if interval == "D":
+        stamps = pd.bdate_range(end=end, periods=int(days * 250 / 365))
+    else:
+        sessions = pd.bdate_range(end=end, periods=max(days, 1))
+        minutes = pd.timedelta_range(start='9h15min', periods=375, freq='min')
+        stamps = pd.DatetimeIndex((sessions.values[:, None] + minutes.values[None, :]).ravel())
+    n = len(stamps)
+
+    volatility = rng.uniform(0.005, 0.04) if interval == "D" else rng.uniform(0.0005, 0.003)
+    close = rng.uniform(20, 3000) * np.exp(np.cumsum(rng.normal(0, volatility, n)))
+    open_ = close * (1 + rng.normal(0, volatility / 2, n))
+    high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, volatility / 2, n)))
+    low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, volatility / 2, n)))
+    volume = np.round(rng.lognormal(11, 1, n))
+    return {
+        'datetime': stamps.values.astype('datetime64[ns]'),
+        'open': open_,
+        'high': high,
+        'low': low,
+        'close': close,
+        'volume': volume
+    }
+
+def _with_edge_case(columns, kind, rng):
+    """Inject a shape that tends to break optimized code paths."""
+    columns = {name: values.copy() for name, values in columns.items()}
+    n = len(columns['close'])
+    if kind == 'short':
+        keep = slice(n - int(rng.integers(20, 120)), n)
+        columns = {name: values[keep] for name, values in columns.items()}
+    elif kind == 'flat':
+        for name in BAR_COLUMNS[1:5]:
+            columns[name][:] = columns['close'][0]
+    elif kind == 'gap':
+        # A suspension: a block of missing sessions in the middle
+        start = int(rng.integers(n // 4, n // 2))
+        keep = np.r_[0:start, start + int(rng.integers(5, 30)):n]
+        columns = {name: values[keep] for name, values in columns.items()}
+    elif kind == 'zero_volume':
+        columns['volume'][rng.random(n) < 0.2] = 0
+    elif kind == 'spike':
+        i = int(rng.integers(1, n))
+        columns['high'][i] *= 1.5
+        columns['close'][i] *= 1.3
+    return columns
+
+EDGE_CASES = ('short', 'flat', 'gap', 'zero_volume', 'spike')
+
+def synthetic_universe(tokens, days=365, seed=0, edge_case_share=0.1, interval="D"):
+    """
+    Synthetic OHLCV DataFrames for many tokens, with a share of edge cases mixed in.
+
+    Returns:
+        dict: token -> DataFrame
+    """
+    rng = np.random.default_rng(seed)
+    universe = {}
+    for token in tokens:
+        columns = synthetic_bars(token, days, seed=seed, interval=interval)
+        if rng.random() < edge_case_share:
+            columns = _with_edge_case(columns, EDGE_CASES[int(rng.integers(len(EDGE_CASES)))], rng)
+        universe[token] = bars_to_frame(columns)
+    return universe
@@ -0,0 +1,200 @@
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+
+# Higher timeframes built locally from bars that were already fetched.
+# Daily bars roll up into weeks ('W') and months ('M'); 1-minute bars roll up
+# into fixed-width buckets anchored at the 09:15 NSE/BSE session open.
+MINUTE_TIMEFRAMES = {'5': 5, '15': 15, '60': 60}
+SESSION_OFFSET = 15  # minutes past the hour
+
+OHLCV_COLUMNS = ['datetime', 'open', 'high', 'low', 'close', 'volume']
+
+# 1970-01-01 was a Thursday; shifting by two days starts each bucket on a
+# Saturday so a week runs Saturday..Friday, matching pandas' W-FRI periods.
+_WEEK_SHIFT_DAYS = 2
+
+# Resampled bars keyed by (series key, timeframe), least recently used first
+TIMEFRAME_CACHE_SIZE = 20000
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+def _cache_get(cache_key, fingerprint):
+    cached = _cache.get(cache_key)
+    if cached and cached[0] == fingerprint:
+        _cache.move_to_end(cache_key)
+        return cached[1]
+    return None
+
+def _cache_put(cache_key, fingerprint, resampled):
+    _cache[cache_key] = (fingerprint, resampled)
+    _cache.move_to_end(cache_key)
+    while len(_cache) > TIMEFRAME_CACHE_SIZE:
+        _cache.popitem(last=False)
+
+def _bucket_keys(timestamps, timeframe):
+    """Vectorized integer bucket id for every bar of the requested timeframe."""
+    if timeframe == 'W':
+        days = timestamps.astype('datetime64[D]').astype(np.int64)
+        return (days - _WEEK_SHIFT_DAYS) // 7
+    if timeframe == 'M':
+        return timestamps.astype('datetime64[M]').astype(np.int64)
+    if timeframe in MINUTE_TIMEFRAMES:
+        width = np.timedelta64(MINUTE_TIMEFRAMES[timeframe], 'm')
+        offset = np.timedelta64(SESSION_OFFSET, 'm')
+        minutes = (timestamps - offset).astype('datetime64[m]').astype(np.int64)
+        return minutes // width.astype(np.int64)
+    raise ValueError(f"Unsupported timeframe: {timeframe}")
+
+def _aggregate(groups, timestamps, opens, highs, lows, closes, volumes, timeframe):
+    """
+    Roll bars up into buckets with ``reduceat``. ``groups`` separates series
+    (e.g. tokens); bars are expected in time order within each group.
+    """
+    buckets = _bucket_keys(timestamps, timeframe)
+    order = np.lexsort((timestamps, buckets, groups))
+    if not np.array_equal(order, np.arange(len(order))):
+        groups, timestamps, buckets = groups[order], timestamps[order], buckets[order]
+        opens, highs, lows = opens[order], highs[order], lows[order]
+        closes, volumes = closes[order], volumes[order]
+
+    boundary = np.ones(len(buckets), dtype=bool)
+    boundary[1:] = (buckets[1:] != buckets[:-1]) | (groups[1:] != groups[:-1])
+    starts = np.flatnonzero(boundary)
+    ends = np.append(starts[1:], len(buckets)) - 1
+
+    if timeframe in MINUTE_TIMEFRAMES:
+        # Intraday bars are stamped with the start of their bucket
+        width = np.timedelta64(MINUTE_TIMEFRAMES[timeframe], 'm')
+        stamps = (buckets[starts] * width).astype('datetime64[m]') + np.timedelta64(SESSION_OFFSET, 'm')
+    else:
+        # Weekly/monthly bars are stamped with their last trading day
+        stamps = timestamps[ends]
+
+    bars = pd.DataFrame({
+        'datetime': stamps.astype('datetime64[ns]'),
+        'open': opens[starts],
+        'high': np.maximum.reduceat(highs, starts),
+        'low': np.minimum.reduceat(lows, starts),
+        'close': closes[ends],
+        'volume': np.add.reduceat(volumes, starts)
+    })
+    return groups[starts], bars
+
+def _column(frames, name, dtype):
+    return np.concatenate([np.asarray(df[name], dtype=dtype) for df in frames])
+
+def resample_bars(df, timeframe):
+    """
+    Resample OHLCV bars to a higher timeframe.
+
+    Args:
+        df: DataFrame with datetime, open, high, low, close and volume columns
+        timeframe: 'W' or 'M' for daily input, '5', '15' or '60' for 1-minute input
+
+    Returns:
+        DataFrame: One row per bucket
+    """
+    if df.empty:
+        return pd.DataFrame(columns=OHLCV_COLUMNS)
+    _, bars = _aggregate(
+        np.zeros(len(df), dtype=np.int64),
+        pd.to_datetime(df['datetime']).to_numpy(dtype='datetime64[ns]'),
+        *(df[name].to_numpy(dtype=np.float64) for name in OHLCV_COLUMNS[1:]),
+        timeframe
+    )
+    return bars
+
+def resample_universe(frames, timeframe):
+    """
+    Resample many tokens in one vectorized pass over their concatenated bars.
+
+    Args:
+        frames: Mapping of token -> OHLCV DataFrame
+        timeframe: Target timeframe, see ``resample_bars``
+
+    Returns:
+        dict: token -> resampled DataFrame
+    """
+    keys = [key for key, df in frames.items() if not df.empty]
+    if not keys:
+        return {key: pd.DataFrame(columns=OHLCV_COLUMNS) for key in frames}
+    dfs = [frames[key] for key in keys]
+    lengths = np.array([len(df) for df in dfs])
+    groups = np.repeat(np.arange(len(keys)), lengths)
+    timestamps = pd.to_datetime(np.concatenate([np.asarray(df['datetime']) for df in dfs]))
+    bar_groups, bars = _aggregate(
+        groups,
+        np.asarray(timestamps, dtype='datetime64[ns]'),
+        *(_column(dfs, name, np.float64) for name in OHLCV_COLUMNS[1:]),
+        timeframe
+    )
+    bounds = np.searchsorted(bar_groups, np.arange(len(keys) + 1))
+    results = {
+        key: bars.iloc[bounds[i]:bounds[i + 1]].reset_index(drop=True)
+        for i, key in enumerate(keys)
+    }
+    for key in frames:
+        if key not in results:
+            results[key] = pd.DataFrame(columns=OHLCV_COLUMNS)
+    return results
+
+def _fingerprint(df):
+    """Cheap identity of a bar series; the last bar changes while a session is open."""
+    if df.empty:
+        return (0,)
+    last = df.iloc[-1]
+    return (len(df), str(last['datetime']), float(last['close']), float(last['volume']))
+
+def get_timeframe(key, df, timeframe):
+    """
+    Cached ``resample_bars``. ``key`` identifies the series, e.g. (exchange, token);
+    the cached bars are reused until the source bars change. Series without a
+    key are resampled every time.
+    """
+    if key is None:
+        return resample_bars(df, timeframe)
+    fingerprint = _fingerprint(df)
+    with _cache_lock:
+        cached = _cache_get((key, timeframe), fingerprint)
+    if cached is not None:
+        return cached
+    resampled = resample_bars(df, timeframe)
+    with _cache_lock:
+        _cache_put((key, timeframe), fingerprint, resampled)
+    return resampled
+
+def get_timeframe_universe(frames, timeframe):
+    """Cached ``resample_universe``: only tokens whose bars changed are resampled again."""
+    results = {}
+    stale = {}
+    with _cache_lock:
+        for key, df in frames.items():
+            cached = _cache_get((key, timeframe), _fingerprint(df))
+            if cached is not None:
+                results[key] = cached
+            else:
+                stale[key] = df
+    fresh = resample_universe(stale, timeframe) if stale else {}
+    with _cache_lock:
+        for key, resampled in fresh.items():
+            _cache_put((key, timeframe), _fingerprint(stale[key]), resampled)
+    results.update(fresh)
+    return results
+
+def clear_timeframe_cache(token=None, exchange=None):
+    """Drop cached resampled bars, optionally only those of one (exchange, token) series."""
+    with _cache_lock:
+        if token is None and exchange is None:
+            _cache.clear()
+            return
+        for cache_key in list(_cache):
+            key = cache_key[0]
+            if not (isinstance(key, tuple) and len(key) == 2):
+                continue
+            if token is not None and key[1] != token:
+                continue
+            if exchange is not None and key[0] != exchange:
+                continue
+            del _cache[cache_key]
@@ -0,0 +1,182 @@
+import datetime
+import threading
+import time
+from alice_client import initialize_alice, get_history, invalidate_history, IST
+from data_requirements import STRATEGY_REQUIREMENTS, covering_windows
+from advanced_analysis import iter_token_results, analyze_all_tokens_advanced
+from stock_analysis import analyze_all_tokens
+from indicator_snapshot import snapshot_universes, SNAPSHOT_DIR
+from stock_lists import STOCK_LISTS
+
+# NSE/BSE close at 15:30 IST; the second run picks up late EOD corrections
+WARMUP_TIMES = ("15:45", "18:30")
+ADVANCED_STRATEGIES = [
+    "Price Action Breakout",
+    "Volume Profile Analysis",
+    "Market Structure Analysis",
+    "Multi-Factor Analysis"
+]
+BASIC_STRATEGIES = [
+    "EMA, RSI & Support Zone (Buy)",
+    "EMA, RSI & Resistance Zone (Sell)"
+]
+
+_warm_results = {}
+_warm_lock = threading.Lock()
+
+class SystemClock:
+    """Wall clock in IST."""
+
+    def now(self):
+        return datetime.datetime.now(IST)
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+class FakeClock:
+    """Stand-in clock for offline tests: time only moves when told to."""
+
+    def __init__(self, start):
+        self._now = start if start.tzinfo else start.replace(tzinfo=IST)
+
+    def now(self):
+        return self._now
+
+    def sleep(self, seconds):
+        self.advance(seconds=seconds)
+
+    def advance(self, **kwargs):
+        self._now += datetime.timedelta(**kwargs)
+
+def default_universes():
+    """Every configured stock list with its exchange (BSE lists are prefixed 'BSE')."""
+    return {
+        name: ('BSE' if name.startswith('BSE') else 'NSE', tokens)
+        for name, tokens in STOCK_LISTS.items()
+    }
+
+def get_warm_results(exchange, list_name, strategy, date=None):
+    """Precomputed results for today's (or ``date``'s) warm-up, or None."""
+    date = date or SystemClock().now().date()
+    with _warm_lock:
+        return _warm_results.get((exchange, list_name, strategy, date))
+
+def store_warm_results(exchange, list_name, strategy, date, results):
+    with _warm_lock:
+        for key in [k for k in _warm_results if k[3] != date]:
+            del _warm_results[key]
+        _warm_results[(exchange, list_name, strategy, date)] = results
+
+class WarmupScheduler:
+    """
+    Prefetches daily bars and precomputes strategy results after the close.
+
+    ``run_pending`` runs one warm-up if any scheduled time today has passed and
+    not yet been served (so a process started late still warms up once).
+    ``start`` calls it from a daemon thread every ``poll_seconds``.
+    """
+
+    def __init__(self, alice_factory=initialize_alice, times=WARMUP_TIMES, universes=None,
+                 advanced_strategies=ADVANCED_STRATEGIES, basic_strategies=BASIC_STRATEGIES,
+                 clock=None, poll_seconds=60, retry_minutes=15, weekdays_only=True,
+                 snapshot_dir=SNAPSHOT_DIR):
+        self.alice_factory = alice_factory
+        self.times = [datetime.time.fromisoformat(t) for t in times]
+        self.universes = universes or default_universes()
+        self.advanced_strategies = advanced_strategies
+        self.basic_strategies = basic_strategies
+        self.clock = clock or SystemClock()
+        self.poll_seconds = poll_seconds
+        self.retry_minutes = retry_minutes
+        self.weekdays_only = weekdays_only
+        self.snapshot_dir = snapshot_dir
+        self.completed_slots = set()
+        self.last_run = None
+        self._retry_after = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def due_slots(self):
+        """Scheduled datetimes of today that have passed and not run yet."""
+        now = self.clock.now()
+        if self.weekdays_only and now.weekday() >= 5:
+            return []
+        slots = [datetime.datetime.combine(now.date(), t, tzinfo=IST) for t in self.times]
+        return [slot for slot in slots if slot <= now and slot not in self.completed_slots]
+
+    def run_pending(self):
+        """Run a warm-up if one is due. Returns True if a warm-up completed."""
+        due = self.due_slots()
+        if not due:
+            return False
+        now = self.clock.now()
+        if self._retry_after and now < self._retry_after:
+            return False
+        try:
+            self.warm_up()
+        except Exception as e:
+            print(f"Warm-up failed: {e}")
+            self._retry_after = now + datetime.timedelta(minutes=self.retry_minutes)
+            return False
+        self.completed_slots.update(due)
+        self._retry_after = None
+        return True
+
+    def warm_up(self):
+        """Refetch every universe's daily bars and precompute all strategy outputs."""
+        started = self.clock.now()
+        alice = self.alice_factory()
+
+        # Anything cached before this run may end in a partial or uncorrected candle
+        invalidate_history(fetched_before=started)
+
+        # One fetch per stock and interval, covering every strategy run below
+        windows = covering_windows(
+            STRATEGY_REQUIREMENTS[strategy] for strategy in self.advanced_strategies + self.basic_strategies
+        )
+        by_exchange = {}
+        for exchange, tokens in self.universes.values():
+            by_exchange.setdefault(exchange, set()).update(tokens)
+        for exchange, tokens in by_exchange.items():
+            for interval, days in windows.items():
+                for token, _, error in iter_token_results(
+                    lambda t: get_history(alice, t, days, interval, exchange), sorted(tokens)
+                ):
+                    if error is not None:
+                        print(f"Warm-up fetch failed for {token}: {error}")
+
+        date = started.date()
+        # Indicator snapshot for threshold screens, from the bars just fetched
+        if self.snapshot_dir:
+            snapshot_universes(alice, self.universes, date, self.snapshot_dir)
+
+        for list_name, (exchange, tokens) in self.universes.items():
+            for strategy in self.advanced_strategies:
+                store_warm_results(
+                    exchange, list_name, strategy, date,
+                    analyze_all_tokens_advanced(alice, tokens, strategy, exchange)
+                )
+            for strategy in self.basic_strategies:
+                store_warm_results(
+                    exchange, list_name, strategy, date,
+                    analyze_all_tokens(alice, tokens, strategy, exchange)
+                )
+        self.last_run = (started, self.clock.now())
+
+    def start(self):
+        """Run the scheduler loop in a daemon thread."""
+        if self._thread and self._thread.is_alive():
+            return self._thread
+        self._stop.clear()
+
+        def loop():
+            while not self._stop.is_set():
+                self.run_pending()
+                self.clock.sleep(self.poll_seconds)
+
+        self._thread = threading.Thread(target=loop, name="warmup-scheduler", daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self):
+        self._stop.set()
@@ -0,0 +1,449 @@
+import argparse
+import json
+import os
+import socket
+import threading
+import time
+import numpy as np
+import pandas as pd
+from alice_client import initialize_alice, get_history, BROKER_BACKEND
+from advanced_analysis import iter_token_results, needs_universe_bars, finalize_advanced_results
+from broker_backend import SyntheticAlice
+from data_requirements import FULL_HISTORY_DAYS
+from scan_jobs import make_job_id, to_json_safe
+from screening_service import build_screen, resolve_universe
+from warmup import ADVANCED_STRATEGIES
+
+QUEUE_DIR = "work_queue"
+UNIT_SIZE = 50
+LEASE_SECONDS = 300
+MAX_ATTEMPTS = 3
+POLL_SECONDS = 2
+
+STATES = ("pending", "claimed", "done", "results")
+
+def _write_json(path, payload):
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(payload, f, default=to_json_safe)
+    os.replace(tmp_path, path)
+
+def _read_json(path):
+    with open(path, "r") as f:
+        return json.load(f)
+
+def _needs_closes(request):
+    return request['strategy'] in ADVANCED_STRATEGIES and needs_universe_bars(
+        request['strategy'], request.get('max_per_cluster')
+    )
+
+class WorkQueue:
+    """
+    A file-based work queue for one scan, shared by workers on any machine that
+    mounts ``directory``.
+
+    Layout::
+
+        <directory>/<scan_id>/scan.json           the screening request and lease settings
+        <directory>/<scan_id>/pending/<unit>.json  units waiting for a worker
+        <directory>/<scan_id>/claimed/<unit>.json  units being worked on; the mtime is the lease
+        <directory>/<scan_id>/done/<unit>.json     finished units
+        <directory>/<scan_id>/results/<unit>--<worker>.json  per-token results (+ .npz of closes)
+
+    A worker claims a unit by renaming it from pending/ to claimed/, which
+    only one worker can win, and renews the lease by touching the file. Units
+    whose lease expires (a dead or stuck worker) go back to pending/; the
+    coordinator doing so first renames the claim to a private name, so only
+    one coordinator requeues it. Every unit is processed at least once; a
+    unit may finish twice, and ``collect`` merges results by unit and token.
+    Lease expiry compares file times with the local clock, so machines should
+    keep their clocks in sync.
+    """
+
+    def __init__(self, scan_id, directory=QUEUE_DIR):
+        self.scan_id = scan_id
+        self.root = os.path.join(directory, scan_id)
+
+    def path(self, state, name=""):
+        return os.path.join(self.root, state, name)
+
+    @property
+    def spec(self):
+        return _read_json(os.path.join(self.root, "scan.json"))
+
+    def units(self, state):
+        try:
+            return sorted(name for name in os.listdir(self.path(state)) if name.endswith(".json"))
+        except FileNotFoundError:
+            return []
+
+    def status(self):
+        """Unit counts per state."""
+        return {state: len(self.units(state)) for state in ("pending", "claimed", "done")}
+
+    def requeue_expired(self, now=None):
+        """Return units whose lease expired to pending/; returns the requeued unit names."""
+        spec = self.spec
+        now = now or time.time()
+        self._restore_abandoned(now, spec['lease_seconds'])
+        requeued = []
+        for name in self.units("claimed"):
+            claimed = self.path("claimed", name)
+            try:
+                if now - os.path.getmtime(claimed) <= spec['lease_seconds']:
+                    continue
+                # Take the claim under a private name first: only one
+                # coordinator wins the rename, and the worker can no longer
+                # renew or complete it under us
+                taken = self.path(
+                    "claimed", f"{name[:-len('.json')]}.{now:.0f}.{os.getpid()}.{threading.get_ident()}.requeue"
+                )
+                os.rename(claimed, taken)
+            except FileNotFoundError:
+                continue  # finished, or taken by another coordinator
+            if time.time() - os.path.getmtime(taken) <= spec['lease_seconds']:
+                # Renewed between the check and the rename: give it back
+                os.rename(taken, claimed)
+                continue
+            try:
+                unit = _read_json(taken)
+            except json.JSONDecodeError:
+                os.rename(taken, claimed)
+                continue
+            if os.path.exists(self.path("done", name)):
+                self._remove(taken)
+                continue
+
+            unit['attempts'] = unit.get('attempts', 0) + 1
+            if unit['attempts'] >= spec['max_attempts']:
+                # A unit that keeps killing its workers: give up on it
+                reason = f"Lease expired {unit['attempts']} times"
+                self._write_results(unit, "requeue", [], {token: reason for token in unit['tokens']})
+                self._mark_done(unit, "requeue")
+                self._remove(taken)
+                continue
+            _write_json(taken, unit)
+            os.rename(taken, self.path("pending", name))
+            requeued.append(name)
+        return requeued
+
+    def _restore_abandoned(self, now, lease_seconds):
+        """Put back claims a coordinator took for requeueing but never finished (it died)."""
+        try:
+            names = os.listdir(self.path("claimed"))
+        except FileNotFoundError:
+            return
+        for name in names:
+            if not name.endswith(".requeue"):
+                continue
+            unit_name, taken_at = name.split(".")[:2]
+            if now - int(taken_at) > lease_seconds:
+                try:
+                    os.rename(self.path("claimed", name), self.path("claimed", f"{unit_name}.json"))
+                except FileNotFoundError:
+                    pass  # restored by another coordinator
+
+    def claim(self):
+        """Take the next pending unit, or None when there is none."""
+        for name in self.units("pending"):
+            pending = self.path("pending", name)
+            claimed = self.path("claimed", name)
+            try:
+                # rename keeps the mtime, so start the lease before the unit
+                # shows up in claimed/, where a coordinator could take it as expired
+                os.utime(pending)
+                os.rename(pending, claimed)
+            except FileNotFoundError:
+                continue  # another worker won it
+            if os.path.exists(self.path("done", name)):
+                self._remove(claimed)
+                continue
+            return _read_json(claimed)
+        return None
+
+    def heartbeat(self, unit):
+        """Renew a claimed unit's lease."""
+        try:
+            os.utime(self.path("claimed", f"{unit['unit']}.json"))
+        except FileNotFoundError:
+            pass  # requeued meanwhile; the finished results still count
+
+    def complete(self, unit, worker, token_results, failed, closes=None):
+        """Publish a unit's results and mark it done."""
+        self._write_results(unit, worker, token_results, failed, closes)
+        self._mark_done(unit, worker)
+        self._remove(self.path("claimed", f"{unit['unit']}.json"))
+
+    def _write_results(self, unit, worker, token_results, failed, closes=None):
+        base = self.path("results", f"{unit['unit']}--{worker}")
+        if closes:
+            lengths = np.array([len(df) for df in closes.values()], dtype=np.int64)
+            tmp_path = f"{base}.tmp.npz"
+            np.savez_compressed(
+                tmp_path,
+                tokens=np.array([str(token) for token in closes], dtype=str),
+                lengths=lengths,
+                datetime=np.concatenate([np.asarray(df['datetime'], dtype='datetime64[ns]') for df in closes.values()]).astype(np.int64),
+                close=np.concatenate([np.asarray(df['close'], dtype=np.float64) for df in closes.values()])
+            )
+            os.replace(tmp_path, f"{base}.npz")
+        _write_json(f"{base}.json", {
+            'unit': unit['unit'],
+            'worker': worker,
+            'completed': [{'token': t, 'result': r} for t, r in token_results],
+            'failed': [{'token': t, 'reason': r} for t, r in failed.items()]
+        })
+
+    def _mark_done(self, unit, worker):
+        _write_json(self.path("done", f"{unit['unit']}.json"), {
+            'unit': unit['unit'], 'worker': worker, 'finished': time.time()
+        })
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+def submit(request, directory=QUEUE_DIR, unit_size=UNIT_SIZE, lease_seconds=LEASE_SECONDS,
+           max_attempts=MAX_ATTEMPTS):
+    """
+    Shard a screening request (the ``screening_service`` request format) into
+    work units. Submitting the same request again on the same day returns the
+    existing scan.
+
+    Returns:
+        WorkQueue
+    """
+    tokens, exchange = resolve_universe(request)
+    request = dict(request, tokens=tokens, exchange=exchange)
+    request.pop('list', None)
+    params = {k: v for k, v in request.items() if k not in ('tokens', 'exchange', 'format')}
+    queue = WorkQueue(make_job_id("queue", tokens, exchange, **params), directory)
+    if os.path.exists(os.path.join(queue.root, "scan.json")):
+        return queue
+
+    for state in STATES:
+        os.makedirs(queue.path(state), exist_ok=True)
+    for index, start in enumerate(range(0, len(tokens), unit_size)):
+        name = f"{index:05d}"
+        _write_json(queue.path("pending", f"{name}.json"), {
+            'unit': name, 'tokens': tokens[start:start + unit_size], 'attempts': 0
+        })
+    _write_json(os.path.join(queue.root, "scan.json"), {
+        'scan_id': queue.scan_id,
+        'request': request,
+        'units': (len(tokens) + unit_size - 1) // unit_size,
+        'lease_seconds': lease_seconds,
+        'max_attempts': max_attempts,
+        'submitted': time.time()
+    })
+    return queue
+
+def process_unit(alice, queue, unit, worker, max_workers=50):
+    """Analyze one unit's tokens, renewing its lease meanwhile, and publish the results."""
+    spec = queue.spec
+    request = dict(spec['request'], tokens=unit['tokens'])
+    _, analyze_token, _ = build_screen(alice, request)
+    stop = threading.Event()
+
+    def renew():
+        while not stop.wait(spec['lease_seconds'] / 3):
+            queue.heartbeat(unit)
+
+    renewer = threading.Thread(target=renew, daemon=True)
+    renewer.start()
+    try:
+        token_results = []
+        failed = {}
+        for token, result, error in iter_token_results(analyze_token, unit['tokens'], max_workers):
+            if error is not None:
+                failed[token] = f"{type(error).__name__}: {error}"
+            else:
+                # Non-qualifying tokens too, so a retry clears an earlier failure
+                token_results.append((token, result))
+
+        closes = None
+        if _needs_closes(request):
+            # Served from the bars the analysis just cached
+            closes = {}
+            for token in unit['tokens']:
+                if token in failed:
+                    continue
+                try:
+                    closes[token] = get_history(alice, token, FULL_HISTORY_DAYS, "D", request['exchange'])[1]
+                except Exception as e:
+                    print(f"Could not collect closes for {token}: {e}")
+        queue.complete(unit, worker, token_results, failed, closes)
+    finally:
+        stop.set()
+
+def run_worker(alice, directory=QUEUE_DIR, scan_id=None, worker=None, follow=False,
+               poll_seconds=POLL_SECONDS, max_workers=50):
+    """
+    Pull and process units until none are left (or forever with follow=True).
+
+    Args:
+        scan_id: Only work on this scan (default: every scan in ``directory``)
+        worker: Worker name in result files (default: host-pid)
+
+    Returns:
+        int: Units processed
+    """
+    worker = worker or f"{socket.gethostname()}-{os.getpid()}"
+    processed = 0
+    while True:
+        scan_ids = [scan_id] if scan_id else sorted(os.listdir(directory)) if os.path.isdir(directory) else []
+        busy = False
+        for current in scan_ids:
+            queue = WorkQueue(current, directory)
+            if not os.path.exists(os.path.join(queue.root, "scan.json")):
+                continue
+            queue.requeue_expired()
+            unit = queue.claim()
+            while unit is not None:
+                try:
+                    process_unit(alice, queue, unit, worker, max_workers)
+                    processed += 1
+                except Exception as e:
+                    # Leave the claim to expire so another attempt picks it up
+                    print(f"Unit {current}/{unit['unit']} failed: {e}")
+                unit = queue.claim()
+            busy = busy or bool(queue.units("claimed"))
+        if not follow and not busy:
+            return processed
+        time.sleep(poll_seconds)
+
+def _load_closes(path):
+    with np.load(path) as data:
+        tokens, lengths = data['tokens'], data['lengths']
+        stamps = data['datetime'].astype('datetime64[ns]')
+        closes = data['close']
+    frames = {}
+    for token, start, length in zip(tokens, np.cumsum(lengths) - lengths, lengths):
+        frames[str(token)] = pd.DataFrame({
+            'datetime': stamps[start:start + length], 'close': closes[start:start + length]
+        })
+    return frames
+
+def collect(queue, alice=None):
+    """
+    Merge the results of every finished unit.
+
+    Duplicate deliveries of a unit are merged by token, preferring a result
+    over a failure. Cross-sectional strategies are finalized here over the
+    closes the workers shipped, so the universe is not fetched again (only
+    the benchmark, which needs ``alice``).
+
+    Returns:
+        dict: results, failed (token -> reason), complete (all units done),
+        status (unit counts)
+    """
+    spec = queue.spec
+    request = spec['request']
+    by_key = {str(token): token for token in request['tokens']}
+    completed = {}
+    failed = {}
+    bars = {}
+    for name in sorted(os.listdir(queue.path("results"))):
+        if not name.endswith(".json"):
+            continue
+        payload = _read_json(queue.path("results", name))
+        for entry in payload['completed']:
+            completed[by_key[str(entry['token'])]] = entry['result']
+        for entry in payload['failed']:
+            failed.setdefault(by_key[str(entry['token'])], entry['reason'])
+        closes_path = queue.path("results", name[:-len(".json")] + ".npz")
+        if os.path.exists(closes_path):
+            for key, frame in _load_closes(closes_path).items():
+                bars[by_key[key]] = frame
+
+    # A token that succeeded on any delivery is not a failure
+    failed = {token: reason for token, reason in failed.items() if token not in completed}
+    token_results = [(t, completed[t]) for t in request['tokens'] if completed.get(t)]
+    if _needs_closes(request):
+        token_results = finalize_advanced_results(
+            alice, request['tokens'], token_results, bars, request['strategy'],
+            request['exchange'], request.get('max_per_cluster')
+        )
+    status = queue.status()
+    return {
+        'results': [result for _, result in token_results],
+        'failed': failed,
+        'complete': status['done'] == spec['units'],
+        'status': status
+    }
+
+def _make_alice(backend, latency):
+    if backend == "synthetic":
+        return SyntheticAlice(latency=latency)
+    return initialize_alice(backend)
+
+def main():
+    parser = argparse.ArgumentParser(description="Run screens across worker processes through a shared work queue.")
+    parser.add_argument("--dir", default=QUEUE_DIR, help="Queue directory shared by all workers")
+    parser.add_argument("--backend", default=BROKER_BACKEND, choices=["live", "record", "replay", "synthetic"])
+    parser.add_argument("--latency", type=float, default=0.0, help="Synthetic broker latency in seconds")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    submit_parser = commands.add_parser("submit", help="Shard a screen into work units")
+    submit_parser.add_argument("--strategy", required=True)
+    submit_parser.add_argument("--list", help="Stock list name")
+    submit_parser.add_argument("--tokens", help="Comma-separated tokens instead of a list")
+    submit_parser.add_argument("--exchange")
+    submit_parser.add_argument("--params", help="JSON params for Custom Price Movement")
+    submit_parser.add_argument("--expression", help="Filter expression for Custom Filter")
+    submit_parser.add_argument("--max-per-cluster", type=int)
+    submit_parser.add_argument("--unit-size", type=int, default=UNIT_SIZE)
+    submit_parser.add_argument("--lease", type=int, default=LEASE_SECONDS, help="Seconds before an unrenewed unit is requeued")
+
+    worker_parser = commands.add_parser("worker", help="Process units")
+    worker_parser.add_argument("--scan", help="Only this scan id")
+    worker_parser.add_argument("--follow", action="store_true", help="Keep polling for new scans")
+
+    collect_parser = commands.add_parser("collect", help="Merge a scan's results")
+    collect_parser.add_argument("--scan", required=True)
+    collect_parser.add_argument("--output", help="Write results to this .json or .arrow file")
+
+    status_parser = commands.add_parser("status", help="Show a scan's unit counts")
+    status_parser.add_argument("--scan", required=True)
+    args = parser.parse_args()
+
+    if args.command == "submit":
+        request = {'strategy': args.strategy}
+        if args.tokens:
+            request['tokens'] = [int(t) if t.strip().isdigit() else t.strip() for t in args.tokens.split(",")]
+        else:
+            request['list'] = args.list
+        for key, value in (('exchange', args.exchange), ('expression', args.expression),
+                           ('max_per_cluster', args.max_per_cluster)):
+            if value is not None:
+                request[key] = value
+        if args.params:
+            request['params'] = json.loads(args.params)
+        queue = submit(request, args.dir, args.unit_size, args.lease)
+        print(queue.scan_id)
+    elif args.command == "worker":
+        processed = run_worker(_make_alice(args.backend, args.latency), args.dir, args.scan, follow=args.follow)
+        print(f"Processed {processed} units")
+    elif args.command == "status":
+        print(json.dumps(WorkQueue(args.scan, args.dir).status()))
+    else:
+        queue = WorkQueue(args.scan, args.dir)
+        alice = _make_alice(args.backend, args.latency) if _needs_closes(queue.spec['request']) else None
+        merged = collect(queue, alice)
+        if not merged['complete']:
+            print(f"Scan not finished yet: {merged['status']}")
+        print(f"{len(merged['results'])} results, {len(merged['failed'])} failed tokens")
+        if args.output and args.output.endswith(".arrow"):
+            import pyarrow as pa
+            from screening_service import results_to_arrow
+            table = results_to_arrow(merged['results'])
+            with pa.OSFile(args.output, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        elif args.output:
+            _write_json(args.output, merged)
+
+if __name__ == "__main__":
+    main()